@@ -1,30 +1,352 @@
+import contextlib
 import datetime as dt
 import json
 import os
-import os.path as op
-import pickle
 import re
+import shutil
 import time
 import typing
 from datetime import timezone
 
 import appdirs as ad
-import requests as rq
-from bs4 import BeautifulSoup, Tag
-from bs4.element import NavigableString
-from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.firefox.webdriver import WebDriver as FirefoxWebDriver
-from selenium.webdriver.chrome.webdriver import WebDriver as ChromeWebDriver
-from selenium.webdriver.edge.webdriver import WebDriver as EdgeWebDriver
-from selenium.webdriver.ie.webdriver import WebDriver as IeWebDriver
-from selenium.webdriver.safari.webdriver import WebDriver as SafariWebDriver
 
 import aocstat.config as config
+import aocstat.context as context
+import aocstat.policy as policy
+import aocstat.store as store
+
+# requests, bs4 and selenium are slow to import, so they are only imported by
+# the functions that need them, as are the modules only needed to fetch or write
+# (rate limiting, locking, history, hashing). This keeps fully cached commands fast.
 
 data_dir = ad.user_data_dir(appname="aocstat", appauthor=False)
 
+AOC_URL = "https://adventofcode.com"
+
+_session = None
+# background refreshes started by this process, by their arguments
+_refreshes = {}
+# the last private board parsed, by year and id, with the hash of its body
+_priv_lbs = {}
+
+
+class OfflineError(ConnectionError):
+    """Raised when Advent of Code can't be reached, or only answers with an error."""
+
+
+class RateLimitedError(Exception):
+    """Raised when a request would exceed the rate limit (see `ratelimit.acquire`), and the caller would rather not
+    wait, or the wait would be too long."""
+
+    def __init__(self, bucket, wait):
+        super().__init__(
+            f"Rate limit for '{bucket}' requests reached, {wait:.0f}s until the next is allowed."
+        )
+        self.bucket = bucket
+        self.wait = wait
+
+
+class LoginRequiredError(Exception):
+    """Raised when logging in is needed, but the user can't be asked to (see `context.Context.interactive`)."""
+
+
+class CacheOnlyError(Exception):
+    """Raised when a request to Advent of Code is needed, but only the cache may be used (see
+    `context.Context.cache_only`)."""
+
+
+def get_session():
+    """Gets the HTTP session shared by every request to Advent of Code, creating it on first use.
+
+    The session keeps a pool of (by default keep-alive) connections, so that a single command making several
+    requests only pays for the TCP and TLS handshakes once. Pool size and keep-alive are read from config.
+
+    Returns:
+        session (requests.Session): The shared session.
+    """
+    global _session
+    if _session is None:
+        import requests as rq
+        from requests.adapters import HTTPAdapter
+
+        _session = rq.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.get("pool_size"))
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+        _session.headers["User-Agent"] = (
+            "aocstat (+https://github.com/hectorBrown/aocstat)"
+        )
+        if not config.get("keep_alive"):
+            _session.headers["Connection"] = "close"
+    return _session
+
+
+def _set_session_cookie(cookie):
+    get_session().cookies.set("session", cookie)
+
+
+def _request(method, path, auth=False, stale_ok=False, limit=True, **kwargs):
+    """Makes a request to Advent of Code through the shared session.
+
+    Every attempt is bounded by the `connect_timeout` and `read_timeout` config values. GET requests are idempotent,
+    so those that fail to connect, time out or get a 5xx response are retried up to `retries` times, with jittered
+    exponential backoff starting at `backoff` seconds. Other methods (i.e. submitting an answer) are never retried.
+    The outcome and latency of each attempt are recorded in the current context.
+
+    Each request takes one token (however many attempts it makes) from the rate limiter shared by all aocstat
+    processes, waiting (a bounded time) for one if necessary. Requests that are rate limited are recorded in the
+    current context. If `proxy_url` is set, requests go through that `aocstat proxy` instead, which rate limits on
+    everyone's behalf.
+
+    Args:
+        method (str): HTTP method.
+        path (str): Path relative to the Advent of Code root, e.g. `/2024/day/1`.
+        auth (bool, optional): Attach the session cookie (authenticating if necessary). Defaults to False.
+        stale_ok (bool, optional): Raise rather than wait for the rate limiter, because the caller has stale data it
+            can fall back on. Defaults to False.
+        limit (bool, optional): Take a token from the rate limiter. Only False for a request the caller has already
+            taken a token for, i.e. one made again after logging in again. Defaults to True.
+
+    Raises:
+        CacheOnlyError: If the current context may only use the cache.
+        OfflineError: If the final attempt fails to connect or times out.
+        RateLimitedError: If the rate limit has been reached, and either `stale_ok` or the wait would be too long. Also
+            if the response is a 429, as a proxy sends when its rate limit has been reached.
+
+    Returns:
+        response (requests.Response): The response.
+    """
+    import random
+
+    import requests as rq
+
+    import aocstat.ratelimit as ratelimit
+
+    ctx = context.current()
+    if ctx.cache_only:
+        raise CacheOnlyError(f"{method} {path} isn't cached.")
+    session = get_session()
+    if auth and "session" not in session.cookies:
+        _set_session_cookie(get_cookie())
+    ctx.requests[f"{method} {path}"] += 1
+
+    retries = config.get("retries") if method == "GET" else 0
+    timeout = (config.get("connect_timeout"), config.get("read_timeout"))
+    proxy_url = config.get("proxy_url")
+    # a proxy rate limits on its clients' behalf
+    if limit and proxy_url is None:
+        try:
+            ratelimit.acquire(ratelimit.bucket(method, path), block=not stale_ok)
+        except RateLimitedError as e:
+            ctx.rate_limited.append(e)
+            raise
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(random.uniform(0, config.get("backoff") * 2 ** (attempt - 1)))
+        start = time.perf_counter()
+        try:
+            res = session.request(
+                method, f"{proxy_url or AOC_URL}{path}", timeout=timeout, **kwargs
+            )
+        except (rq.exceptions.ConnectionError, rq.exceptions.Timeout) as e:
+            ctx.attempts.append(
+                (method, path, attempt, type(e).__name__, time.perf_counter() - start)
+            )
+            if attempt == retries:
+                _write_cache("offline", {"time": time.time()})
+                raise OfflineError(f"Couldn't reach Advent of Code ({e}).") from e
+            continue
+        ctx.attempts.append(
+            (method, path, attempt, res.status_code, time.perf_counter() - start)
+        )
+        if res.status_code < 500 or attempt == retries:
+            break
+
+    _store().delete("offline")
+    if res.status_code == 429:
+        # i.e. an `aocstat proxy` whose budget for this request is spent
+        e = RateLimitedError(
+            ratelimit.bucket(method, path), float(res.headers.get("Retry-After", 0))
+        )
+        ctx.rate_limited.append(e)
+        raise e
+    return res
+
+
+def _get_day_page(yr, day):
+    """Gets the parsed page for a given day, fetching it at most once per invocation.
+
+    Args:
+        yr (int): Year of the event.
+        day (int): Day of the event.
+
+    Returns:
+        soup (BeautifulSoup): The parsed page.
+    """
+    from bs4 import BeautifulSoup
+
+    ctx = context.current()
+    path = f"/{yr}/day/{day}"
+    if path not in ctx.pages:
+        ctx.pages[path] = BeautifulSoup(
+            _request("GET", path, auth=True).content, "html.parser"
+        )
+    return ctx.pages[path]
+
+
+def _store():
+    """Gets the store backing the cache, as set by `cache_backend`.
+
+    Returns:
+        store (store.PickleStore|store.SQLiteStore): The cache's store.
+    """
+    return store.open_store(config.get("cache_backend"), data_dir)
+
+
+def _read_cache(key):
+    """Reads the cache entry `key`, if it exists.
+
+    Args:
+        key (str): Name of the cache entry.
+
+    Returns:
+        value: The cached value, None if there is no such entry.
+    """
+    ctx = context.current()
+    value = _store().read(key)
+    if value is not None:
+        ctx.cache_hits[key] += 1
+    else:
+        ctx.cache_misses[key] += 1
+    return value
+
+
+def _write_cache(key, value):
+    """Writes `value` to the cache entry `key`. Writes are atomic, so concurrent readers see either the old value or
+    the new one, never a partial write.
+
+    Args:
+        key (str): Name of the cache entry.
+        value: Value to cache.
+    """
+    _store().write(key, value)
+    context.current().cache_writes[key] += 1
+
+
+@contextlib.contextmanager
+def _single_flight(key, since=None):
+    """Makes fetches of the cache entry `key` single-flight, across threads and processes. Whoever takes the lock
+    first fetches, and anyone waiting behind them gets the entry they wrote instead of fetching it again.
+
+    Args:
+        key (str): Name of the cache entry.
+        since (float|None, optional): Unix time after which a write counts as fresh. Defaults to None, for when we
+            started waiting for the lock.
+
+    Yields:
+        fetched: The entry, if it was written while we waited for the lock. Otherwise None, and the caller should fetch.
+    """
+    from aocstat.lock import locked
+
+    start = time.time() if since is None else since
+    with locked(f"{data_dir}/{key}.lock"):
+        written = _store().written(key)
+        yield _read_cache(key) if written is not None and written >= start else None
+
+
+def _logged_in(res):
+    # JSON is only served to someone logged in, and every page they're served has a link to log out
+    return res.content[:1] != b"<" or b"/auth/logout" in res.content
+
+
+def _fetch_revalidated(path, cached=None, auth=False):
+    """Gets `path`, revalidating the cache record `cached` (if given) against the server.
+
+    Validators stored in `cached` are sent as `If-None-Match`/`If-Modified-Since`, so an unchanged resource costs a
+    304 with no body. Servers that ignore validators are caught by comparing the body's hash to the one cached.
+
+    Only a successful response is returned, so callers can cache whatever they make of it. If `auth` is set and the
+    response is for someone logged out (i.e. the session cookie has expired), we log in again and fetch it again.
+
+    Args:
+        path (str): Path relative to the Advent of Code root.
+        cached (dict|None, optional): Cache record as returned by `_cache_record`. Defaults to None.
+        auth (bool, optional): Attach the session cookie. Defaults to False.
+
+    Raises:
+        OfflineError: If the response is an error.
+        ValueError: If the response is still for someone logged out after logging in again.
+
+    Returns:
+        res (requests.Response): The response.
+        unchanged (bool): Whether the resource is unchanged from `cached`.
+    """
+    import hashlib
+
+    headers = {}
+    if cached is not None:
+        if cached.get("etag") is not None:
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified") is not None:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    res = _request("GET", path, auth=auth, stale_ok=cached is not None, headers=headers)
+    unchanged = cached is not None and (
+        res.status_code == 304
+        or hashlib.sha256(res.content).hexdigest() == cached.get("hash")
+    )
+    if unchanged:
+        return res, unchanged
+    if auth and res.status_code == 200 and not _logged_in(res):
+        get_cookie(cache_invalid=True)
+        # the token taken for the first request pays for this one
+        res = _request("GET", path, auth=True, limit=False)
+        if res.status_code == 200 and not _logged_in(res):
+            raise ValueError("Advent of Code didn't accept the session cookie.")
+    if res.status_code != 200:
+        raise OfflineError(
+            f"Advent of Code answered {path} with status {res.status_code}."
+        )
+    return res, False
+
+
+def _cache_record(res, content):
+    """Builds a cache record for `content`, keeping the validators from the response it was obtained from.
+
+    Args:
+        res (requests.Response): The response `content` was obtained from.
+        content: Value to cache.
+
+    Returns:
+        record (dict): The cache record.
+    """
+    import hashlib
+
+    return {
+        "time": time.time(),
+        "content": content,
+        "etag": res.headers.get("ETag"),
+        "last_modified": res.headers.get("Last-Modified"),
+        "hash": hashlib.sha256(res.content).hexdigest(),
+    }
+
+
+def _refresh_record(res, cached):
+    """Marks the cache record `cached` as fresh after a successful revalidation.
+
+    Args:
+        res (requests.Response): The revalidating response.
+        cached (dict): The cache record.
+
+    Returns:
+        record (dict): The refreshed cache record.
+    """
+    cached["time"] = time.time()
+    if res.headers.get("ETag") is not None:
+        cached["etag"] = res.headers["ETag"]
+    if res.headers.get("Last-Modified") is not None:
+        cached["last_modified"] = res.headers["Last-Modified"]
+    return cached
+
 
 def get_cookie(cache_invalid=False):
     """Gets session cookie from cache if present and not marked invalid. Authenticates and caches otherwise.
@@ -32,12 +354,19 @@ def get_cookie(cache_invalid=False):
     Args:
         cache_invalid (bool, optional): Force authentication by setting to `True`. Defaults to False.
 
+    Raises:
+        LoginRequiredError: If authentication is needed, but the current context isn't interactive.
+
     Returns:
         cookie (str): Session cookie.
     """
-    if op.exists(f"{data_dir}/cookie") and not cache_invalid:
-        with open(f"{data_dir}/cookie", "rb") as f:
-            return pickle.load(f)
+    ctx = context.current()
+    if ctx.cookie is None and not cache_invalid:
+        ctx.cookie = _read_cache("cookie")
+    if ctx.cookie is not None and not cache_invalid:
+        return ctx.cookie
+    elif not ctx.interactive:
+        raise LoginRequiredError("Logging in to Advent of Code is needed.")
     else:
         # get cookie with selenium
         print(
@@ -60,19 +389,36 @@ def get_cookie(cache_invalid=False):
 
         cookie = None
         if not selection == "6":
+            from selenium.common.exceptions import (
+                StaleElementReferenceException,
+                TimeoutException,
+            )
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support.wait import WebDriverWait
+
             wd = None
             input("Please press ENTER to open a web browser... ")
             try:
                 if selection in ["1", ""]:
-                    wd = FirefoxWebDriver()
+                    from selenium.webdriver.firefox.webdriver import WebDriver
+
+                    wd = WebDriver()
                 elif selection == "2":
-                    wd = ChromeWebDriver()
+                    from selenium.webdriver.chrome.webdriver import WebDriver
+
+                    wd = WebDriver()
                 elif selection == "3":
-                    wd = EdgeWebDriver()
+                    from selenium.webdriver.edge.webdriver import WebDriver
+
+                    wd = WebDriver()
                 elif selection == "4":
-                    wd = IeWebDriver()
+                    from selenium.webdriver.ie.webdriver import WebDriver
+
+                    wd = WebDriver()
                 elif selection == "5":
-                    wd = SafariWebDriver()
+                    from selenium.webdriver.safari.webdriver import WebDriver
+
+                    wd = WebDriver()
             except Exception:
                 print(
                     "\nYou don't have a driver installed for that browser, please try again.\n"
@@ -114,8 +460,10 @@ def get_cookie(cache_invalid=False):
             cookie = input("session=").strip()
             print("\nSaved.")
 
-        with open(f"{data_dir}/cookie", "wb") as f:
-            pickle.dump(cookie, f)
+        _write_cache("cookie", cookie)
+        ctx.cookie = cookie
+        if _session is not None:
+            _set_session_cookie(cookie)
         return cookie
 
 
@@ -178,72 +526,267 @@ def get_user_id():
     Returns:
         id (int): User id.
     """
-    if op.exists(f"{data_dir}/id"):
-        with open(f"{data_dir}/id", "rb") as f:
-            return pickle.load(f)
-
-    cookie = get_cookie()
-    req = rq.get(
-        f"https://adventofcode.com/{get_most_recent_year()}/settings",
-        cookies={"session": cookie},
-    )
-    soup = BeautifulSoup(req.content, "html.parser")
-    id = int(
-        typing.cast(
-            NavigableString, soup.find(string=re.compile(r"\(anonymous user #(\d+)\)"))
-        ).split("#")[1][:-1]
-    )
-    with open(f"{data_dir}/id", "wb") as f:
-        pickle.dump(id, f)
-    return id
+    ctx = context.current()
+    if ctx.user_id is not None:
+        return ctx.user_id
+    ctx.user_id = _read_cache("id")
+    if ctx.user_id is not None:
+        return ctx.user_id
+
+    with _single_flight("id") as fetched:
+        if fetched is not None:
+            ctx.user_id = fetched
+            return ctx.user_id
+
+        from bs4 import BeautifulSoup
+        from bs4.element import NavigableString
+
+        req = _request("GET", f"/{get_most_recent_year()}/settings", auth=True)
+        soup = BeautifulSoup(req.content, "html.parser")
+        id = int(
+            typing.cast(
+                NavigableString,
+                soup.find(string=re.compile(r"\(anonymous user #(\d+)\)")),
+            ).split("#")[1][:-1]
+        )
+        _write_cache("id", id)
+        ctx.user_id = id
+        return id
 
 
 def get_priv_lb(id, yr, force_update=False):
-    """Gets a private board, from cache as long as cache was obtained `< ttl` ago.
+    """Gets a private board, from cache as long as it is fresh (see `policy.priv_lb_ttl`).
 
     Args:
         id (int): Board id.
         yr (int): Year of the event.
-        force_update (bool): Skip cache regardless of ttl and get board from server. Defaults to False.
-        ttl (int): Cache ttl. Defaults to 900.
+        force_update (bool): Skip cache regardless of ttl and get board from server. Defaults to False. The cached
+            board is still served if the server can't be reached or the rate limit has been reached.
 
     Returns:
         board (dict): Raw leaderboard data.
         cached (bool | float): Whether the board was cached or not (i.e. if it was obtained from the server or not). If it was cached, the time it was cached is returned.
     """
 
-    if op.exists(f"{data_dir}/lb_{yr}_{id}") and not force_update:
-        cached_lb = None
-        with open(f"{data_dir}/lb_{yr}_{id}", "rb") as f:
-            cached_lb = pickle.load(f)
-        if time.time() - cached_lb["time"] <= config.get("ttl"):
-            return (json.loads(cached_lb["content"]), cached_lb["time"])
-        elif not connected():
-            return (json.loads(cached_lb["content"]), cached_lb["time"])
+    cached_lb = _read_cache(f"lb_{yr}_{id}")
+    if force_update:
+        return _fetch_priv_lb(id, yr, cached_lb)
+    if _usable_priv_lb(cached_lb, yr):
+        return (_parse_priv_lb(id, yr, cached_lb), cached_lb["time"])
+    if cached_lb is not None and config.get("stale_while_revalidate"):
+        _refresh_in_background("priv_lb", yr, id)
+        return (_parse_priv_lb(id, yr, cached_lb), cached_lb["time"])
+    return _fetch_priv_lb(id, yr, cached_lb)
+
+
+def _fetch_priv_lb(id, yr, cached_lb, since=None):
+    with _single_flight(f"lb_{yr}_{id}", since=since) as fetched:
+        if fetched is not None:
+            return (_parse_priv_lb(id, yr, fetched), False)
+        if since is not None:
+            # a background refresh, which someone may have beaten to it
+            cached_lb = _read_cache(f"lb_{yr}_{id}")
+            fresh_since = time.time() - policy.priv_lb_ttl(yr)
+            if cached_lb is not None and cached_lb["time"] >= fresh_since:
+                return (_parse_priv_lb(id, yr, cached_lb), cached_lb["time"])
+
+        path = f"/{yr}/leaderboard/private/view/{id}.json"
+        try:
+            lb, unchanged = _fetch_revalidated(path, cached_lb, auth=True)
+        except (OfflineError, RateLimitedError):
+            if cached_lb is None:
+                raise
+            return (_parse_priv_lb(id, yr, cached_lb), cached_lb["time"])
+        import aocstat.history as history
+
+        if unchanged:
+            record = _refresh_record(lb, cached_lb)
+            _write_cache(f"lb_{yr}_{id}", record)
+            lb = _parse_priv_lb(id, yr, record)
+            if not history.recorded(data_dir, yr, id):
+                # cached before its history was kept (or after it was purged)
+                history.record(data_dir, yr, id, lb, record["time"])
+            return (lb, False)
+        record = _cache_record(lb, lb.content)
+        _write_cache(f"lb_{yr}_{id}", record)
+        lb = _parse_priv_lb(id, yr, record)
+        history.record(data_dir, yr, id, lb, record["time"])
+
+        return (lb, False)
+
+
+def _parse_priv_lb(id, yr, record):
+    """Parses a private board from its cache record. The last board parsed is kept for as long as its body is
+    unchanged, so a board that revalidates (or is read again from cache) isn't parsed again.
 
-    cookie = get_cookie()
-    lb = rq.get(
-        f"https://adventofcode.com/{yr}/leaderboard/private/view/{id}.json",
-        cookies={"session": cookie},
+    Args:
+        id (int): Board id.
+        yr (int): Year of the event.
+        record (dict): Cache record of the board.
+
+    Returns:
+        board (dict): Raw leaderboard data.
+    """
+    body_hash = record.get("hash")
+    parsed = _priv_lbs.get((yr, id))
+    if body_hash is not None and parsed is not None and parsed[0] == body_hash:
+        return parsed[1]
+    lb = json.loads(record["content"])
+    _priv_lbs[(yr, id)] = (body_hash, lb)
+    return lb
+
+
+def _usable_priv_lb(cached_lb, yr):
+    return cached_lb is not None and (
+        time.time() - cached_lb["time"] <= policy.priv_lb_ttl(yr) or not connected()
     )
-    # i.e. is HTML
-    if lb.content[0] == "<":
-        cookie = get_cookie(cache_invalid=True)
-        lb = rq.get(
-            f"https://adventofcode.com/{yr}/leaderboard/private/view/{id}.json",
-            cookies={"session": cookie},
-        )
-    with open(f"{data_dir}/lb_{yr}_{id}", "wb") as f:
-        lb_tocache = {
-            "time": time.time(),
-            "content": lb.content,
+
+
+def get_priv_lbs(ids, yr, force_update=False):
+    """Gets several private boards, yielding each one as soon as it is available. Boards that can be served from
+    cache are yielded straight away (as are stale boards, refreshed in the background, if `stale_while_revalidate`
+    is set), the rest are fetched concurrently (by at most `max_workers` threads) and yielded in the order they
+    arrive.
+
+    Args:
+        ids (list(int)): Board ids.
+        yr (int): Year of the event.
+        force_update (bool): Skip cache regardless of ttl and get every board from server. Defaults to False.
+
+    Yields:
+        id (int): Board id.
+        board (dict): Raw leaderboard data.
+        cached (bool | float): As for `get_priv_lb`.
+    """
+    to_fetch = []
+    to_refresh = []
+    for id in ids:
+        cached_lb = None if force_update else _read_cache(f"lb_{yr}_{id}")
+        if _usable_priv_lb(cached_lb, yr):
+            yield id, _parse_priv_lb(id, yr, cached_lb), cached_lb["time"]
+        elif cached_lb is not None and config.get("stale_while_revalidate"):
+            to_refresh.append(id)
+            yield id, _parse_priv_lb(id, yr, cached_lb), cached_lb["time"]
+        else:
+            to_fetch.append(id)
+    if to_refresh:
+        _refresh_in_background("priv_lb", yr, *to_refresh)
+    if not to_fetch:
+        return
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # authenticate once up front rather than racing in the workers
+    _set_session_cookie(get_cookie())
+    with ThreadPoolExecutor(max_workers=config.get("max_workers")) as pool:
+        futures = {
+            pool.submit(get_priv_lb, id, yr, force_update=force_update): id
+            for id in to_fetch
+        }
+        for future in as_completed(futures):
+            yield futures[future], *future.result()
+
+
+def _refresh_in_background(kind, *args):
+    """Starts a detached `python -m aocstat.refresh` to refresh cache entries, which carries on after this process
+    exits. Nothing is started while a refresh of the same entries started by this process is still running.
+
+    Args:
+        kind (str): The kind of entry.
+        *args: Which entries, as arguments to `aocstat.refresh`.
+    """
+    import subprocess
+    import sys
+
+    running = _refreshes.get((kind, *args))
+    if running is not None and running.poll() is None:
+        return
+
+    if sys.platform == "win32":
+        detach = {
+            "creationflags": subprocess.DETACHED_PROCESS
+            | subprocess.CREATE_NEW_PROCESS_GROUP
         }
-        pickle.dump(lb_tocache, f)
+    else:
+        detach = {"start_new_session": True}
+    _refreshes[(kind, *args)] = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "aocstat.refresh",
+            kind,
+            repr(time.time()),
+            *map(str, args),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **detach,
+    )
+
+
+def get_last_look(id, yr):
+    """Gets when a private board was last shown, as marked by `mark_looked`.
+
+    Args:
+        id (int): Board id.
+        yr (int): Year of the event.
+
+    Returns:
+        time (float|None): Unix time the board was last shown, None if it never has been.
+    """
+    look = _read_cache(f"look_{yr}_{id}")
+    return None if look is None else look["time"]
+
+
+def mark_looked(id, yr, cached):
+    """Marks a private board as shown, so that `lb priv --since last` starts from here next time. Nothing is written
+    if the copy shown is one that was already marked.
+
+    Args:
+        id (int): Board id.
+        yr (int): Year of the event.
+        cached (bool | float): As returned by `get_priv_lb` for the copy shown.
+    """
+    last = get_last_look(id, yr)
+    if cached and last is not None and last >= cached:
+        return
+    _write_cache(f"look_{yr}_{id}", {"time": time.time()})
+
 
-    return (json.loads(lb.content), False)
+def merge_priv_lbs(lbs):
+    """Merges several private boards into one, deduplicating members by id. Local scores are recomputed as if every
+    member were on a single board together.
+
+    Args:
+        lbs (list(dict)): Raw leaderboard data for each board, all for the same event.
+
+    Returns:
+        board (dict): Raw leaderboard data for the merged board.
+    """
+    members = {}
+    for lb in lbs:
+        for member_id, member in lb["members"].items():
+            members[member_id] = dict(member, local_score=0)
+
+    # each star is worth one point more than the number of members who got it sooner
+    stars = {}
+    for member_id, member in members.items():
+        for day, levels in member["completion_day_level"].items():
+            for level, star in levels.items():
+                stars.setdefault((day, level), []).append(
+                    (star["get_star_ts"], member_id)
+                )
+    for got_star in stars.values():
+        for i, (_, member_id) in enumerate(sorted(got_star)):
+            members[member_id]["local_score"] += len(members) - i
+
+    return {"event": lbs[0]["event"], "members": members}
 
 
 def _parse_leaderboard_entry(entry_soup, last_pos):
+    from bs4.element import NavigableString
+
     entry = {}
 
     lb_pos = entry_soup.find("span", {"class": "leaderboard-position"})
@@ -290,7 +833,8 @@ def _parse_leaderboard_entry(entry_soup, last_pos):
 
 
 def get_glob_lb(yr, day, part):
-    """Gets the global leaderboard, from the internet as long as the user is connected, and caches it. If the user is not connected, the cached leaderboard is returned.
+    """Gets the global leaderboard, from cache as long as it is fresh (see `policy.glob_lb_ttl`), or if the user is
+    not connected. Both parts of a day's board are fetched and cached together.
 
     Args:
         yr (int): Year of the event.
@@ -303,18 +847,59 @@ def get_glob_lb(yr, day, part):
     """
     if yr >= 2025:
         return None, None
-    if op.exists(f"{data_dir}/glb_{yr}_{day}") and not connected():
-        cached_lb = None
-        with open(f"{data_dir}/glb_{yr}_{day}", "rb") as f:
-            cached_lb = pickle.load(f)
-            return (json.loads(cached_lb["content"]), cached_lb["time"])
-
-    lb_raw = (
-        rq.get(f"https://adventofcode.com/{yr}/leaderboard")
-        if day is None
-        else rq.get(f"https://adventofcode.com/{yr}/leaderboard/day/{day}")
-    )
-    lb_soup = BeautifulSoup(lb_raw.content, "html.parser")
+    cached_lb = _read_cache(f"glb_{yr}_{day}")
+    if cached_lb is not None:
+        content = json.loads(cached_lb["content"])
+        if day is not None and "1" not in content:
+            # cached by an older version, which only kept the part that was viewed
+            cached_lb = None
+        elif (
+            time.time() - cached_lb["time"] <= policy.glob_lb_ttl(yr, day, content)
+            or not connected()
+        ):
+            return (_glob_lb_part(content, day, part), cached_lb["time"])
+
+    with _single_flight(f"glb_{yr}_{day}") as fetched:
+        if fetched is not None:
+            return (_glob_lb_part(json.loads(fetched["content"]), day, part), False)
+
+        try:
+            lb_raw = (
+                _request("GET", f"/{yr}/leaderboard", stale_ok=cached_lb is not None)
+                if day is None
+                else _request(
+                    "GET",
+                    f"/{yr}/leaderboard/day/{day}",
+                    stale_ok=cached_lb is not None,
+                )
+            )
+        except (OfflineError, RateLimitedError):
+            if cached_lb is None:
+                raise
+            return (
+                _glob_lb_part(json.loads(cached_lb["content"]), day, part),
+                cached_lb["time"],
+            )
+        if day is None:
+            lb = _parse_glob_lb(lb_raw.content, day, part)
+        else:
+            lb = {str(p): _parse_glob_lb(lb_raw.content, day, p) for p in [1, 2]}
+
+        _write_cache(
+            f"glb_{yr}_{day}", {"time": time.time(), "content": json.dumps(lb)}
+        )
+
+        return (_glob_lb_part(lb, day, part), False)
+
+
+def _glob_lb_part(lb, day, part):
+    return lb if day is None else lb[str(part)]
+
+
+def _parse_glob_lb(content, day, part):
+    from bs4 import BeautifulSoup, Tag
+
+    lb_soup = BeautifulSoup(content, "html.parser")
 
     parsing_error_msg = "Unexpected parsing error, the AOC website may have changed their HTML structure. Please report this to the developers."
     if day is None:
@@ -351,18 +936,11 @@ def get_glob_lb(yr, day, part):
 
     lb["day"] = day
 
-    with open(f"{data_dir}/glb_{yr}_{day}", "wb") as f:
-        lb_tocache = {
-            "time": time.time(),
-            "content": json.dumps(lb),
-        }
-        pickle.dump(lb_tocache, f)
-
-    return (lb, False)
+    return lb
 
 
 def get_lb_ids(force_update=False):
-    """Gets all private leaderboard ids from cache, as long as cache was obtained `< ttl` ago.
+    """Gets all private leaderboard ids from cache, as long as it is fresh (see `policy.lb_ids_ttl`).
 
     Args:
         force_update (bool, optional): Skip cache regardless of ttl and get board from server. Defaults to False.
@@ -370,34 +948,50 @@ def get_lb_ids(force_update=False):
     Returns:
         boards (list(int)): List of board ids.
     """
-    if op.exists(f"{data_dir}/lb_ids") and not force_update:
-        cached_lb_ids = None
-        with open(f"{data_dir}/lb_ids", "rb") as f:
-            cached_lb_ids = pickle.load(f)
-        if time.time() - cached_lb_ids["time"] <= config.get("ttl"):
-            return cached_lb_ids["content"]
-        elif not connected():
-            return cached_lb_ids["content"]
-
-    cookie = get_cookie()
-    lbs_raw = rq.get(
-        f"https://adventofcode.com/{get_most_recent_year()}/leaderboard/private",
-        cookies={"session": cookie},
-    )
-    lbs_soup = BeautifulSoup(lbs_raw.content, "html.parser")
-    lb_ids = [
-        int(link.attrs["href"].split("view/")[1])
-        for link in lbs_soup.find_all("a", string="[View]")  # type: ignore
-    ]
-    with open(f"{data_dir}/lb_ids", "wb") as f:
-        pickle.dump(
-            {
-                "time": time.time(),
-                "content": lb_ids,
-            },
-            f,
-        )
-    return lb_ids
+    ctx = context.current()
+    if ctx.lb_ids is not None and not force_update:
+        return ctx.lb_ids
+    cached_lb_ids = None if force_update else _read_cache("lb_ids")
+    if cached_lb_ids is not None:
+        if (
+            time.time() - cached_lb_ids["time"]
+            <= policy.lb_ids_ttl(get_most_recent_year())
+            or not connected()
+        ):
+            ctx.lb_ids = cached_lb_ids["content"]
+            return ctx.lb_ids
+
+    with _single_flight("lb_ids") as fetched:
+        if fetched is not None:
+            ctx.lb_ids = fetched["content"]
+            return ctx.lb_ids
+
+        from bs4 import BeautifulSoup
+
+        try:
+            lbs_raw, unchanged = _fetch_revalidated(
+                f"/{get_most_recent_year()}/leaderboard/private",
+                cached_lb_ids,
+                auth=True,
+            )
+        except (OfflineError, RateLimitedError):
+            if cached_lb_ids is None:
+                raise
+            ctx.lb_ids = cached_lb_ids["content"]
+            return ctx.lb_ids
+        if unchanged:
+            _write_cache("lb_ids", _refresh_record(lbs_raw, cached_lb_ids))
+            ctx.lb_ids = cached_lb_ids["content"]
+            return ctx.lb_ids
+
+        lbs_soup = BeautifulSoup(lbs_raw.content, "html.parser")
+        lb_ids = [
+            int(link.attrs["href"].split("view/")[1])
+            for link in lbs_soup.find_all("a", string="[View]")  # type: ignore
+        ]
+        _write_cache("lb_ids", _cache_record(lbs_raw, lb_ids))
+        ctx.lb_ids = lb_ids
+        return lb_ids
 
 
 def get_default_lb_id():
@@ -414,6 +1008,8 @@ def get_default_lb_id():
 
 
 def _parse_puzzle_text(tags, attributes=[]):
+    from bs4.element import NavigableString
+
     output = []
     for tag in tags:
         if isinstance(tag, NavigableString):
@@ -438,32 +1034,30 @@ def get_puzzle(yr, day, part):
     Returns:
         puzzle (dict|None): The parsed puzzle text as a dictionary. None you haven't unlocked the part yet.
     """
-    if op.exists(f"{data_dir}/pz_{yr}_{day}_{part}"):
-        with open(f"{data_dir}/pz_{yr}_{day}_{part}", "rb") as f:
-            return pickle.load(f)
+    cached = _read_cache(f"pz_{yr}_{day}_{part}")
+    if cached is not None:
+        return cached
 
-    cookie = get_cookie()
-    if part > get_current_part(yr, day):
+    current_part = get_current_part(yr, day)
+    if current_part is not None and part > current_part:
         return None
-    puzzle_raw = rq.get(
-        f"https://adventofcode.com/{yr}/day/{day}",
-        cookies={"session": cookie},
-    )
 
-    pz_soup = BeautifulSoup(puzzle_raw.content, "html.parser")
-    parts_available = pz_soup.find_all("article", {"class": "day-desc"})
+    with _single_flight(f"pz_{yr}_{day}_{part}") as fetched:
+        if fetched is not None:
+            return fetched
+        pz_soup = _get_day_page(yr, day)
+        parts_available = pz_soup.find_all("article", {"class": "day-desc"})
 
-    if len(parts_available) < part:
-        raise ValueError("The part you requested is not available yet.")
+        if len(parts_available) < part:
+            raise ValueError("The part you requested is not available yet.")
 
-    part_soup = parts_available[part - 1]
+        part_soup = parts_available[part - 1]
 
-    puzzle = {}
-    puzzle["title"] = parts_available[0].contents[0].string.split(": ")[1][:-4]  # type: ignore
-    puzzle["text"] = _parse_puzzle_text(part_soup.contents[1:])
+        puzzle = {}
+        puzzle["title"] = parts_available[0].contents[0].string.split(": ")[1][:-4]  # type: ignore
+        puzzle["text"] = _parse_puzzle_text(part_soup.contents[1:])
 
-    with open(f"{data_dir}/pz_{yr}_{day}_{part}", "wb") as f:
-        pickle.dump(puzzle, f)
+        _write_cache(f"pz_{yr}_{day}_{part}", puzzle)
     return puzzle
 
 
@@ -477,34 +1071,109 @@ def get_input(yr, day):
     Returns:
         input (str): The puzzle input.
     """
-    if op.exists(f"{data_dir}/in_{yr}_{day}"):
-        with open(f"{data_dir}/in_{yr}_{day}", "rb") as f:
-            return pickle.load(f)
+    with open(get_input_path(yr, day), "rb") as f:
+        return f.read().decode()
 
-    cookie = get_cookie()
-    input_raw = rq.get(
-        f"https://adventofcode.com/{yr}/day/{day}/input",
-        cookies={"session": cookie},
-    )
-    with open(f"{data_dir}/in_{yr}_{day}", "wb") as f:
-        pickle.dump(input_raw.text, f)
-    return input_raw.text
+
+def get_input_path(yr, day):
+    """Get the path of the file holding the raw puzzle input for a given day, fetching it if it isn't cached. Inputs
+    are kept in the blob store, and the cache entry for the day only records which blob.
+
+    Args:
+        yr (int): Year of the event.
+        day (int): Day of the event.
+
+    Returns:
+        path (str): Path of the puzzle input.
+    """
+    key = f"in_{yr}_{day}"
+    entry = _read_cache(key)
+    if isinstance(entry, str):
+        # cached before inputs were kept as blobs
+        entry = {"time": time.time(), "blob": store.put_blob(data_dir, entry.encode())}
+        _write_cache(key, entry)
+    if entry is None:
+        with _single_flight(key) as entry:
+            if entry is None:
+                input_raw = _request("GET", f"/{yr}/day/{day}/input", auth=True)
+                entry = {
+                    "time": time.time(),
+                    "blob": store.put_blob(data_dir, input_raw.content),
+                }
+                _write_cache(key, entry)
+    return store.blob_path(data_dir, entry["blob"])
+
+
+def prefetch(years):
+    """Fills the puzzle and input caches for every unlocked day and part in `years`. Entries already cached are
+    skipped, and each entry is cached as soon as it is fetched, so an interrupted prefetch can simply be run again.
+    Days are fetched concurrently by at most `max_workers` threads, each fetching a day's input and puzzle text
+    (both parts come from the same page).
+
+    Args:
+        years (list(int)): Years of the events to prefetch.
+
+    Yields:
+        yr (int): Year of the day that was just fetched.
+        day (int): The day that was just fetched.
+        remaining (int): Number of days left to fetch.
+    """
+    stars = get_all_stars() if len(years) > 1 else {yr: get_stars(yr) for yr in years}
+
+    to_fetch = []
+    for yr in years:
+        for day in range(1, get_most_recent_day(yr) + 1):
+            # part 2 is only unlocked once part 1 is solved
+            parts = [1, 2] if (stars[yr] >> 2 * (day - 1)) & 0b01 else [1]
+            if _store().written(f"in_{yr}_{day}") is None or any(
+                _store().written(f"pz_{yr}_{day}_{part}") is None for part in parts
+            ):
+                to_fetch.append((yr, day, parts))
+    if not to_fetch:
+        return
+
+    def fetch(yr, day, parts):
+        get_input_path(yr, day)
+        for part in parts:
+            get_puzzle(yr, day, part)
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # authenticate once up front rather than racing in the workers
+    _set_session_cookie(get_cookie())
+    with ThreadPoolExecutor(max_workers=config.get("max_workers")) as pool:
+        futures = {
+            pool.submit(fetch, yr, day, parts): (yr, day) for yr, day, parts in to_fetch
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            yield *futures[future], len(to_fetch) - done
 
 
 def purge_cache():
-    """Purges the cache."""
+    """Purges the cache. The history of private boards isn't cache, since it can't be fetched again, so is kept."""
+    _store().purge()
+    shutil.rmtree(f"{data_dir}/{store.BLOB_DIR}", ignore_errors=True)
     for file in os.listdir(data_dir):
-        if not file == ".gitkeep":
+        if (
+            file != ".gitkeep"
+            and file != store.HISTORY_DIR
+            and not file.startswith(store.DB_NAME)
+            and not file.endswith(".sock")
+        ):
             os.remove(f"{data_dir}/{file}")
 
 
 def connected():
-    """Check if the user is connected to Advent of Code."""
-    try:
-        rq.get("https://adventofcode.com/")
-        return True
-    except rq.exceptions.ConnectionError:
-        return False
+    """Check if the user is connected to Advent of Code. Rather than probing the server, this is inferred from the
+    most recent request: a request that fails to connect marks Advent of Code as unreachable for `offline_ttl`
+    seconds (across invocations), and any request that succeeds clears it.
+
+    Returns:
+        connected (bool): False if a request failed to connect less than `offline_ttl` seconds ago.
+    """
+    offline = _read_cache("offline")
+    return offline is None or time.time() - offline["time"] > config.get("offline_ttl")
 
 
 def submit_answer(yr, day, answer):
@@ -527,13 +1196,16 @@ def submit_answer(yr, day, answer):
     if level is None:
         return None, None, None
 
-    cookie = get_cookie()
+    from bs4 import BeautifulSoup
 
-    res = rq.post(
-        f"https://adventofcode.com/{yr}/day/{day}/answer",
-        {"level": level, "answer": answer},
-        cookies={"session": cookie},
+    res = _request(
+        "POST",
+        f"/{yr}/day/{day}/answer",
+        auth=True,
+        data={"level": level, "answer": answer},
     )
+    # the day page changes once an answer is accepted
+    context.current().pages.pop(f"/{yr}/day/{day}", None)
     res_soup = BeautifulSoup(res.content, "html.parser")
     verdict = None
     parse_error_msg = "Unexpected parsing error, the AOC website may have changed their HTML structure. Please report this to the developers."
@@ -553,10 +1225,141 @@ def submit_answer(yr, day, answer):
         else:
             return False, False, False
     elif "That's the right answer" in verdict:
+        add_star(yr, day, level)
         return True, False, None
     raise Exception("Unexpected response from server, maybe try again later?")
 
 
+def get_stars(yr, force_update=False):
+    """Gets the star bitmap for a given year, from cache as long as it is fresh (see `policy.stars_ttl`). Otherwise it is
+    built from a single fetch of the calendar page for `yr`.
+
+    Bit `2 * (day - 1)` is set if part 1 of `day` is solved, and bit `2 * (day - 1) + 1` if part 2 is.
+
+    Args:
+        yr (int): Year of the event.
+        force_update (bool, optional): Skip cache regardless of ttl and get the calendar from the server. Defaults to False.
+
+    Returns:
+        stars (int): Star bitmap for `yr`.
+    """
+    ctx = context.current()
+    cached_stars = None
+    if not force_update:
+        if _get_cached_stars(yr) is not None:
+            return ctx.stars[yr]
+        cached_stars = _read_cache(f"stars_{yr}")
+        if cached_stars is not None and not connected():
+            ctx.stars[yr] = cached_stars["content"]
+            return ctx.stars[yr]
+
+    from bs4 import BeautifulSoup
+
+    try:
+        calendar_raw, unchanged = _fetch_revalidated(f"/{yr}", cached_stars, auth=True)
+    except (OfflineError, RateLimitedError):
+        if cached_stars is None:
+            raise
+        ctx.stars[yr] = cached_stars["content"]
+        return ctx.stars[yr]
+    if unchanged:
+        _write_cache(f"stars_{yr}", _refresh_record(calendar_raw, cached_stars))
+        ctx.stars[yr] = cached_stars["content"]
+        return ctx.stars[yr]
+
+    calendar_soup = BeautifulSoup(calendar_raw.content, "html.parser")
+    stars = 0
+    for link in calendar_soup.find_all(
+        "a", {"class": re.compile(r"^calendar-day\d+$")}
+    ):
+        classes = link.attrs["class"]
+        day = int(
+            [c for c in classes if re.fullmatch(r"calendar-day\d+", c)][0][
+                len("calendar-day") :
+            ]
+        )
+        if "calendar-verycomplete" in classes:
+            stars |= 0b11 << 2 * (day - 1)
+        elif "calendar-complete" in classes:
+            stars |= 0b01 << 2 * (day - 1)
+
+    _write_cache(f"stars_{yr}", _cache_record(calendar_raw, stars))
+    ctx.stars[yr] = stars
+    return stars
+
+
+def _get_cached_stars(yr):
+    """Gets the star bitmap for `yr` without touching the network, as long as the cache is fresh (see
+    `policy.stars_ttl`).
+
+    Returns:
+        stars (int|None): Star bitmap for `yr`, None if there is no fresh cache.
+    """
+    ctx = context.current()
+    if yr in ctx.stars:
+        return ctx.stars[yr]
+    cached_stars = _read_cache(f"stars_{yr}")
+    if cached_stars is not None:
+        if time.time() - cached_stars["time"] <= policy.stars_ttl(yr):
+            ctx.stars[yr] = cached_stars["content"]
+            return ctx.stars[yr]
+    return None
+
+
+def get_all_stars(force_update=False):
+    """Gets the star bitmap for every event, fetching uncached calendars concurrently.
+
+    Args:
+        force_update (bool, optional): Skip cache and get every calendar from the server. Defaults to False.
+
+    Returns:
+        stars (dict): Star bitmap for each year from 2015 to the most recent event.
+    """
+    years = range(2015, get_most_recent_year() + 1)
+    stars = {} if force_update else {yr: _get_cached_stars(yr) for yr in years}
+    to_fetch = [yr for yr in years if stars.get(yr) is None]
+    if to_fetch:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # authenticate once up front rather than racing in the workers
+        _set_session_cookie(get_cookie())
+        with ThreadPoolExecutor(max_workers=config.get("max_workers")) as pool:
+            for yr, yr_stars in zip(
+                to_fetch,
+                pool.map(lambda y: get_stars(y, force_update=force_update), to_fetch),
+            ):
+                stars[yr] = yr_stars
+    return stars
+
+
+def get_day_stars(yr, day):
+    """Gets the number of stars earned on a given day.
+
+    Args:
+        yr (int): Year of the event.
+        day (int): Day of the event.
+
+    Returns:
+        stars (int): 0, 1 or 2.
+    """
+    return bin((get_stars(yr) >> 2 * (day - 1)) & 0b11).count("1")
+
+
+def add_star(yr, day, part):
+    """Records a newly earned star in the cached star bitmap.
+
+    Args:
+        yr (int): Year of the event.
+        day (int): Day of the event.
+        part (int): Part that was solved.
+    """
+    stars = get_stars(yr) | 1 << (2 * (day - 1) + part - 1)
+    cached_stars = _read_cache(f"stars_{yr}")
+    cached_stars["content"] = stars
+    _write_cache(f"stars_{yr}", cached_stars)
+    context.current().stars[yr] = stars
+
+
 def get_current_part(yr, day):
     """Returns the lowest unsolved level for the given year and day.
 
@@ -567,18 +1370,8 @@ def get_current_part(yr, day):
     Returns:
         level (int|None): Lowest unsolved level. None if both are solved.
     """
-    cookie = get_cookie()
-    puzzle_raw = rq.get(
-        f"https://adventofcode.com/{yr}/day/{day}",
-        cookies={"session": cookie},
-    )
-    pz_soup = BeautifulSoup(puzzle_raw.content, "html.parser")
-    success = pz_soup.find_all("p", {"class": "day-success"})
-    if len(success) == 0:
-        return 1
-    if "**" in success[0].contents[0].string:  # type: ignore
-        return None
-    return 2
+    stars = get_day_stars(yr, day)
+    return None if stars == 2 else stars + 1
 
 
 def get_default_puzzle(year, day, part):
@@ -604,10 +1397,9 @@ def get_default_puzzle(year, day, part):
     # exists, return the contents... when submitting we need to update this
     # cache on a correct answer.
     if year is None and day is None and part is None:
-        if config.get("cache_progress") and op.exists(f"{data_dir}/prog"):
-            with open(f"{data_dir}/prog", "rb") as f:
-                output = pickle.load(f)
-                return output["year"], output["day"], output["part"]
+        output = _read_cache("prog") if config.get("cache_progress") else None
+        if output is not None:
+            return output["year"], output["day"], output["part"]
 
     if year is None:
         year = get_most_recent_year()
@@ -617,8 +1409,7 @@ def get_default_puzzle(year, day, part):
         part = get_current_part(year, day)
     output = {"year": year, "day": day, "part": part}
     if config.get("cache_progress"):
-        with open(f"{data_dir}/prog", "wb") as f:
-            pickle.dump(output, f)
+        _write_cache("prog", output)
     return output["year"], output["day"], output["part"]
 
 
@@ -631,10 +1422,10 @@ def get_earliest_uncompleted_day(year):
     Returns:
         day (int): The earliest uncompleted day for `year`.
     """
-    day = 1
-    while get_current_part(year, day) is None:
-        day += 1
-    return day
+    for day in range(1, get_max_day(year) + 1):
+        if get_current_part(year, day) is not None:
+            return day
+    return get_max_day(year)
 
 
 def set_prog(year, day, part):
@@ -647,28 +1438,23 @@ def set_prog(year, day, part):
         part (int): The part of the default puzzle.
     """
     if config.get("cache_progress"):
-        with open(f"{data_dir}/prog", "wb") as f:
-            pickle.dump({"year": year, "day": day, "part": part}, f)
+        _write_cache("prog", {"year": year, "day": day, "part": part})
 
 
 def step_progress():
-    """Steps progress to the next part, and if the current part is 2, steps to
-    the next day. If cache_progress is not enabled, this function does
-    nothing."""
+    """Steps progress to the earliest unsolved part at or after the current
+    one, according to the star index. If cache_progress is not enabled, this
+    function does nothing."""
     if not config.get("cache_progress"):
         return
-    if not op.exists(f"{data_dir}/prog"):
+    prog = _read_cache("prog")
+    if prog is None:
         return
-    with open(f"{data_dir}/prog", "rb") as f:
-        prog = pickle.load(f)
-    if prog["part"] == 1:
-        prog["part"] = 2
-    else:
-        prog["part"] = 1
-        prog["day"] += 1
-        if prog["day"] > get_max_day(prog["year"]):
-            prog["day"] = 1
-            prog["year"] += 1
-
-    with open(f"{data_dir}/prog", "wb") as f:
-        pickle.dump(prog, f)
+    year, day = prog["year"], prog["day"]
+    while year <= get_most_recent_year() and get_current_part(year, day) is None:
+        day += 1
+        if day > get_max_day(year):
+            day = 1
+            year += 1
+    part = get_current_part(year, day) if year <= get_most_recent_year() else 1
+    _write_cache("prog", {"year": year, "day": day, "part": part})
@@ -0,0 +1,185 @@
+import os
+import re
+import time
+
+import aocstat.api as api
+import aocstat.config as config
+import aocstat.context as context
+import aocstat.store as store
+from aocstat.lock import locked
+
+# cache entry recording the hits, misses and last access of every other entry
+USAGE_KEY = "usage"
+# log of reads not yet folded into the usage entry, appended to by every invocation
+USAGE_LOG = ".usage.log"
+# size of the log, in bytes, past which it is folded straight away
+USAGE_LOG_MAX = 64 * 2**10
+
+# category of each kind of cache entry, by key pattern. Entries matching none of
+# these (progress, rate limit buckets, usage, ...) are internal state.
+CATEGORIES = [
+    ("auth", r"cookie|id"),
+    ("leaderboards", r"lb_\d+_\d+|lb_ids"),
+    ("global", r"glb_(\d+)_\d+"),
+    ("stars", r"stars_(\d+)"),
+    ("puzzles", r"pz_\d+_\d+_\d+"),
+    ("inputs", r"in_\d+_\d+"),
+]
+STATE = "state"
+
+
+def category(key):
+    """Gets the category of a cache entry.
+
+    Args:
+        key (str): Name of the cache entry.
+
+    Returns:
+        category (str): The entry's category, `STATE` if it is internal state.
+    """
+    for name, pattern in CATEGORIES:
+        if re.fullmatch(pattern, key):
+            return name
+    return STATE
+
+
+def evictable(key):
+    """Whether a cache entry can be evicted. Only data that can be fetched again and may change is evictable:
+    credentials, state, puzzles and inputs never are, nor are global boards and stars for finished events.
+
+    Args:
+        key (str): Name of the cache entry.
+
+    Returns:
+        evictable (bool): True if the entry can be evicted.
+    """
+    name = category(key)
+    if name == "leaderboards":
+        return True
+    if name in ["global", "stars"]:
+        yr = int(re.fullmatch(dict(CATEGORIES)[name], key).group(1))
+        return yr >= api.get_most_recent_year()
+    return False
+
+
+def _size(cache, key):
+    size = cache.size(key) or 0
+    if category(key) == "inputs":
+        # inputs live in the blob store, the entry only names the blob
+        entry = cache.read(key)
+        if isinstance(entry, dict):
+            try:
+                size += os.stat(store.blob_path(api.data_dir, entry["blob"])).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+def record_usage():
+    """Logs the cache hits and misses of this invocation. Rather than updating the usage entry, which would mean
+    locking, reading and rewriting it on every invocation, they are appended to a log that is folded into the usage
+    entry whenever it is needed, or once it grows past `USAGE_LOG_MAX`.
+    """
+    ctx = context.current()
+    keys = [key for key in ctx.cache_hits | ctx.cache_misses if category(key) != STATE]
+    if not keys:
+        return
+    now = time.time()
+    # a single small append is atomic, so concurrent invocations needn't lock the log
+    with open(f"{api.data_dir}/{USAGE_LOG}", "a") as f:
+        f.write(
+            "".join(
+                f"{now} {key} {ctx.cache_hits[key]} {ctx.cache_misses[key]}\n"
+                for key in keys
+            )
+        )
+        size = f.tell()
+    if size > USAGE_LOG_MAX:
+        # otherwise commands that only read (and so never prune) grow it forever
+        with locked(f"{api.data_dir}/{USAGE_KEY}.lock"):
+            _fold_usage()
+
+
+def _fold_usage():
+    # must be called holding the usage lock
+    usage = api._read_cache(USAGE_KEY) or {}
+    folding = f"{api.data_dir}/{USAGE_LOG}.{os.getpid()}"
+    try:
+        os.replace(f"{api.data_dir}/{USAGE_LOG}", folding)
+    except FileNotFoundError:
+        return usage
+    with open(folding) as f:
+        for line in f:
+            access, key, hits, misses = line.split()
+            entry = usage.setdefault(key, {"hits": 0, "misses": 0, "last_access": 0})
+            entry["hits"] += int(hits)
+            entry["misses"] += int(misses)
+            entry["last_access"] = max(entry["last_access"], float(access))
+    api._write_cache(USAGE_KEY, usage)
+    os.remove(folding)
+    return usage
+
+
+def stats():
+    """Gets the size and usage of the cache, by category.
+
+    Returns:
+        stats (dict): For each category, a dict of the number of `entries`, their size in `bytes`, the `hits` and
+            `misses` of reads of them, and the bytes that are `reclaimable` by evicting them.
+    """
+    cache = api._store()
+    with locked(f"{api.data_dir}/{USAGE_KEY}.lock"):
+        usage = _fold_usage()
+    output = {}
+    for key in set(cache.keys()) | set(usage):
+        name = category(key)
+        stat = output.setdefault(
+            name, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "reclaimable": 0}
+        )
+        stat["hits"] += usage.get(key, {}).get("hits", 0)
+        stat["misses"] += usage.get(key, {}).get("misses", 0)
+        size = _size(cache, key) if cache.written(key) is not None else None
+        if size is not None:
+            stat["entries"] += 1
+            stat["bytes"] += size
+            if evictable(key):
+                stat["reclaimable"] += size
+    return output
+
+
+def prune(budget=None):
+    """Evicts evictable entries, least recently used first, until the cache fits in `budget`.
+
+    Args:
+        budget (int|None, optional): Size to shrink the cache to, in bytes. Defaults to the `cache_budget` config value.
+
+    Returns:
+        evicted (list(str)): Names of the evicted entries.
+        freed (int): Bytes freed.
+    """
+    budget = config.get("cache_budget") if budget is None else budget
+    cache = api._store()
+    with locked(f"{api.data_dir}/{USAGE_KEY}.lock"):
+        # folded even when nothing is evicted, so the log doesn't grow forever
+        usage = _fold_usage()
+        sizes = {key: _size(cache, key) for key in cache.keys()}
+        total = sum(sizes.values())
+        # entries never read since usage was first recorded go by when they were written
+        candidates = sorted(
+            [key for key in sizes if evictable(key)],
+            key=lambda key: usage.get(key, {}).get("last_access")
+            or cache.written(key)
+            or 0,
+        )
+        evicted = []
+        freed = 0
+        for key in candidates:
+            if total - freed <= budget:
+                break
+            cache.delete(key)
+            usage.pop(key, None)
+            evicted.append(key)
+            freed += sizes[key]
+        if evicted:
+            api._write_cache(USAGE_KEY, usage)
+    return evicted, freed
@@ -1,6 +1,8 @@
 import json
 import os.path as op
 import aocstat.api as api
+import aocstat.context as context
+import aocstat.store as store
 
 import appdirs as ad
 
@@ -8,8 +10,24 @@ config_dir = ad.user_config_dir(appname="aocstat", appauthor=False)
 
 DEFAULTS = {
     "ttl": 900,
+    "archive_ttl": 86400,
+    "release_ttl": 60,
     "default_lb_id": None,
     "cache_progress": True,
+    "pool_size": 4,
+    "keep_alive": True,
+    "max_workers": 4,
+    "offline_ttl": 60,
+    "connect_timeout": 5,
+    "read_timeout": 30,
+    "retries": 2,
+    "backoff": 0.5,
+    "report_latency": False,
+    "rate_limit": True,
+    "cache_backend": "pickle",
+    "cache_budget": 50 * 2**20,
+    "stale_while_revalidate": False,
+    "proxy_url": None,
 }
 
 
@@ -21,15 +39,94 @@ def _default_lb_id_type(x):
         raise ValueError()
 
 
+def _bool_type(x):
+    if isinstance(x, bool):
+        return x
+    if str(x).lower() in ["true", "1", "yes", "on"]:
+        return True
+    if str(x).lower() in ["false", "0", "no", "off"]:
+        return False
+    raise ValueError()
+
+
+def _positive_int_type(x):
+    if int(x) > 0:
+        return int(x)
+    else:
+        raise ValueError()
+
+
+def _non_negative_int_type(x):
+    if int(x) >= 0:
+        return int(x)
+    else:
+        raise ValueError()
+
+
+def _cache_backend_type(x):
+    if x in store.BACKENDS:
+        return x
+    else:
+        raise ValueError()
+
+
+def _proxy_url_type(x):
+    if x is None or str(x).lower() == "none":
+        return None
+    if str(x).startswith(("http://", "https://")):
+        return str(x).rstrip("/")
+    else:
+        raise ValueError()
+
+
+def _positive_float_type(x):
+    if float(x) > 0:
+        return float(x)
+    else:
+        raise ValueError()
+
+
 TYPES = {
     "ttl": lambda x: int(x),
+    "archive_ttl": lambda x: int(x),
+    "release_ttl": lambda x: int(x),
     "default_lb_id": _default_lb_id_type,
     "cache_progress": lambda x: bool(x),
+    "pool_size": _positive_int_type,
+    "keep_alive": _bool_type,
+    "max_workers": _positive_int_type,
+    "offline_ttl": lambda x: int(x),
+    "connect_timeout": _positive_float_type,
+    "read_timeout": _positive_float_type,
+    "retries": _non_negative_int_type,
+    "backoff": _positive_float_type,
+    "report_latency": _bool_type,
+    "rate_limit": _bool_type,
+    "cache_backend": _cache_backend_type,
+    "cache_budget": _non_negative_int_type,
+    "stale_while_revalidate": _bool_type,
+    "proxy_url": _proxy_url_type,
 }
 TYPE_ERRS = {
     "ttl": "Value of 'ttl' must be an integer.",
+    "archive_ttl": "Value of 'archive_ttl' must be an integer.",
+    "release_ttl": "Value of 'release_ttl' must be an integer.",
     "default_lb_id": "Value of lb_id must be a valid leaderabord ID or None.",
     "cache_progress": "Value of 'cache_progress' must be a boolean.",
+    "pool_size": "Value of 'pool_size' must be a positive integer.",
+    "keep_alive": "Value of 'keep_alive' must be a boolean.",
+    "max_workers": "Value of 'max_workers' must be a positive integer.",
+    "offline_ttl": "Value of 'offline_ttl' must be an integer.",
+    "connect_timeout": "Value of 'connect_timeout' must be a positive number of seconds.",
+    "read_timeout": "Value of 'read_timeout' must be a positive number of seconds.",
+    "retries": "Value of 'retries' must be a non-negative integer.",
+    "backoff": "Value of 'backoff' must be a positive number of seconds.",
+    "report_latency": "Value of 'report_latency' must be a boolean.",
+    "rate_limit": "Value of 'rate_limit' must be a boolean.",
+    "cache_backend": f"Value of 'cache_backend' must be one of {', '.join(store.BACKENDS)}.",
+    "cache_budget": "Value of 'cache_budget' must be a non-negative integer number of bytes.",
+    "stale_while_revalidate": "Value of 'stale_while_revalidate' must be a boolean.",
+    "proxy_url": "Value of 'proxy_url' must be an http(s) URL, or None.",
 }
 
 
@@ -42,13 +139,11 @@ def get(key):
     Returns:
         value: Value of `key` in config file, or default value if not found.
     """
-    config = _read_config(op.join(config_dir, "config.json"))
-    if config is None:
-        return DEFAULTS[key] if key in DEFAULTS else None
-    else:
-        return (
-            config[key] if key in config else DEFAULTS[key] if key in DEFAULTS else None
-        )
+    ctx = context.current()
+    if ctx.config is None:
+        ctx.config = _read_config(op.join(config_dir, "config.json")) or {}
+    config = ctx.config
+    return config[key] if key in config else DEFAULTS[key] if key in DEFAULTS else None
 
 
 def set(key, value):
@@ -113,3 +208,4 @@ def _write_config(path, data):
         curr[key] = data[key]
     with open(path, "w") as f:
         json.dump(curr, indent=4, fp=f)
+    context.current().config = None
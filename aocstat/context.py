@@ -0,0 +1,70 @@
+import collections
+
+_current = None
+
+
+class Context:
+    """Resources memoized for a single invocation of aocstat.
+
+    Attributes:
+        interactive (bool): Whether the user can be asked to log in. False for invocations in the background.
+        cache_only (bool): Whether only the cache may be used, i.e. no requests may be made to Advent of Code.
+        defer_output (bool): Whether output that may be paged is left for whoever started the invocation to show,
+            rather than shown by it. True for commands the daemon runs for a client.
+        deferred_output (str|None): Output left to be shown, once there is any.
+        cookie (str|None): Session cookie, once read.
+        user_id (int|None): User id, once read.
+        config (dict|None): Parsed config file, once read.
+        pages (dict): Parsed pages keyed by request path.
+        stars (dict): Star bitmaps keyed by year.
+        lb_ids (list(int)|None): Private leaderboard ids, once read.
+        requests (collections.Counter): Number of network requests made, keyed by '{METHOD} {path}'.
+        attempts (list(tuple)): (method, path, attempt, status code or exception name, latency) for every attempt
+            at a network request, including retries.
+        cache_hits (collections.Counter): Number of reads of each cache entry that found it.
+        cache_misses (collections.Counter): Number of reads of each cache entry that didn't find it.
+        cache_writes (collections.Counter): Number of writes to each cache entry.
+        rate_limited (list(api.RateLimitedError)): Requests refused by the rate limiter, whether or not cached data
+            was served instead.
+    """
+
+    def __init__(self):
+        self.interactive = True
+        self.cache_only = False
+        self.defer_output = False
+        self.deferred_output = None
+        self.cookie = None
+        self.user_id = None
+        self.config = None
+        self.pages = {}
+        self.stars = {}
+        self.lb_ids = None
+        self.requests = collections.Counter()
+        self.attempts = []
+        self.cache_hits = collections.Counter()
+        self.cache_misses = collections.Counter()
+        self.cache_writes = collections.Counter()
+        self.rate_limited = []
+
+
+def current():
+    """Gets the context for the current invocation, creating one if none exists.
+
+    Returns:
+        ctx (Context): The current context.
+    """
+    global _current
+    if _current is None:
+        _current = Context()
+    return _current
+
+
+def new():
+    """Starts a fresh context, discarding everything memoized by the previous one.
+
+    Returns:
+        ctx (Context): The new context.
+    """
+    global _current
+    _current = Context()
+    return _current
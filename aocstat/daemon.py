@@ -0,0 +1,204 @@
+import json
+import os
+import os.path as op
+import sys
+
+import aocstat.api as api
+import aocstat.store as store
+
+# commands that are answered by the daemon when it is running. Only read-only
+# commands are forwarded, and they're sent back to be run by the client
+# unless they can be answered from the cache alone.
+FORWARDED = [
+    ["lb", "priv"],
+    ["lb", "glob"],
+    ["pz", "input"],
+    ["pz", "view"],
+    ["progress"],
+]
+
+
+def socket_path():
+    """Gets the path of the daemon's socket.
+
+    Returns:
+        path (str): Path of the Unix domain socket the daemon listens on.
+    """
+    return op.join(api.data_dir, store.SOCKET_NAME)
+
+
+def _connect():
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path())
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, message, fds=()):
+    import socket
+
+    socket.send_fds(sock, [json.dumps(message).encode() + b"\n"], list(fds))
+
+
+def _recv(sock, maxfds=0):
+    import socket
+
+    data = b""
+    fds = []
+    while not data.endswith(b"\n"):
+        chunk, new_fds, _, _ = socket.recv_fds(sock, 65536, maxfds)
+        if not chunk:
+            return None, fds
+        data += chunk
+        fds += new_fds
+    return json.loads(data), fds
+
+
+def forward(args):
+    """Runs a command in the daemon, if it is running and the command can be forwarded. The daemon is handed this
+    process's stdin, stdout, stderr and terminal size, and sends back any output that may need paging to be paged
+    here, so the pager is this process's rather than the daemon's. Commands that can't be answered from the cache
+    alone (or need a login) aren't run by the daemon, so that it's never kept waiting on Advent of Code.
+
+    Args:
+        args (list(str)): Command line arguments.
+
+    Returns:
+        code (int|None): Exit code of the command, None if it wasn't run by the daemon and should be run here.
+    """
+    if sys.platform == "win32" or not op.exists(socket_path()):
+        return None
+    if not any(args[: len(command)] == command for command in FORWARDED):
+        return None
+    sock = _connect()
+    if sock is None:
+        return None
+    import shutil
+
+    columns, lines = shutil.get_terminal_size()
+    with sock:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _send(sock, {"args": args, "columns": columns, "lines": lines}, [0, 1, 2])
+        reply, _ = _recv(sock)
+    if reply is None:
+        # the daemon died mid-command, there's no telling what was written
+        return 1
+    if reply.get("output") is not None:
+        import aocstat.main as main
+
+        main._dynamic_page(reply["output"], no_pager=False)
+    return reply["code"]
+
+
+def stop():
+    """Stops the daemon, if it is running.
+
+    Returns:
+        stopped (bool): True if a daemon was running.
+    """
+    sock = None if sys.platform == "win32" else _connect()
+    if sock is None:
+        return False
+    with sock:
+        _send(sock, {"stop": True})
+        _recv(sock)
+    return True
+
+
+def _run(message, fds):
+    import aocstat.context as context
+    import aocstat.main as main
+
+    saved = [os.dup(fd) for fd in range(3)]
+    # output is formatted for the client's terminal, which is what these are checked for first
+    saved_env = {name: os.environ.get(name) for name in ("COLUMNS", "LINES")}
+    try:
+        for fd, client_fd in enumerate(fds):
+            os.dup2(client_fd, fd)
+        os.environ["COLUMNS"] = str(message["columns"])
+        os.environ["LINES"] = str(message["lines"])
+        try:
+            main.run(message["args"], client=True)
+            code = 0
+        except (api.CacheOnlyError, api.LoginRequiredError):
+            # left for the client to run itself
+            code = None
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception:
+            import traceback
+
+            traceback.print_exc()
+            code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        for fd, saved_fd in enumerate(saved):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+        for client_fd in fds:
+            os.close(client_fd)
+    return code, None if code is None else context.current().deferred_output
+
+
+def serve():
+    """Runs the daemon until it is stopped, answering forwarded commands one at a time. Commands are only answered
+    from the cache (those that need a request are sent back to the client), so none can hold up those behind it.
+    The parsed cache entries and everything imported are kept between commands, so each command only pays for what
+    actually changed.
+    """
+    import socket
+
+    import aocstat.store as store
+
+    if sys.platform == "win32":
+        raise OSError(
+            "The daemon needs Unix domain sockets, which aren't supported on Windows."
+        )
+    if _connect() is not None:
+        raise OSError(f"A daemon is already listening on {socket_path()}.")
+    if op.exists(socket_path()):
+        # left behind by a daemon that didn't exit cleanly
+        os.remove(socket_path())
+
+    store.memoize()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path())
+        server.listen()
+        print(f"Listening on {socket_path()}.", flush=True)
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                message, fds = _recv(conn, maxfds=3)
+                if message is None:
+                    for fd in fds:
+                        os.close(fd)
+                    continue
+                if message.get("stop"):
+                    _send(conn, {"code": 0})
+                    break
+                code, output = _run(message, fds)
+                try:
+                    _send(conn, {"code": code, "output": output})
+                except OSError:
+                    # the client went away before it got its exit code
+                    pass
+    finally:
+        server.close()
+        os.remove(socket_path())
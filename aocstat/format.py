@@ -17,6 +17,7 @@ ANSI_COLOURS = {
     "bold_bright_yellow": "\033[1;93m",
     "bold_bright_cyan": "\033[1;96m",
     "green": "\033[0;32m",
+    "red": "\033[0;31m",
 }
 
 
@@ -152,6 +153,136 @@ def format_priv_lb(lb, cached, year, ansi_on):
     return res
 
 
+def format_priv_lb_changes(changes, ansi_on):
+    """Return a string describing what changed on a private leaderboard.
+
+    Args:
+        changes (dict | None): Changes to describe, as returned by `history.changes`. None if the leaderboard has no
+            history.
+        ansi_on (bool): Whether to use ANSI colour codes.
+
+    Returns:
+        changes_str (str): The stars earned, then the score and rank changes of each member whose score or rank
+            changed.
+    """
+
+    def _time(t):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+    if changes is None:
+        return "This leaderboard has no history yet, it is recorded each time the leaderboard is fetched.\n"
+    res = _colour(
+        f"Changes from {_time(changes['since'])} to {_time(changes['until'])}\n",
+        "grey",
+        ansi_on,
+    )
+    if not any(changes[k] for k in ["stars", "members", "joined", "left"]):
+        return res + "\nNothing has changed.\n"
+    if changes["stars"]:
+        res += "\n"
+        for ts, name, day, part in changes["stars"]:
+            res += (
+                _colour(f"{_time(ts)}  ", "bright_grey", ansi_on)
+                + _colour(
+                    "* ",
+                    "bright_yellow" if part == 2 else "bright_blue",
+                    ansi_on,
+                    alt_text="* " if part == 2 else "- ",
+                )
+                + f"day {day:>2} part {part}  "
+                + _colour(name, "bright_white", ansi_on)
+                + "\n"
+            )
+    if changes["members"]:
+        res += "\n"
+        score_offset = max(len(str(row["score"][1])) for row in changes["members"])
+        for row in changes["members"]:
+            (old_score, new_score), (old_rank, new_rank) = row["score"], row["rank"]
+            # scores can fall too, when someone leaves
+            gained = new_score - (old_score or 0)
+            if gained > 0:
+                gained_colour = "green"
+            elif gained < 0:
+                gained_colour = "red"
+            else:
+                gained_colour = "grey"
+            if old_rank is None:
+                move = _colour("new", "bright_cyan", ansi_on)
+            elif new_rank < old_rank:
+                move = _colour(f"^{old_rank - new_rank}", "bright_green", ansi_on)
+            elif new_rank > old_rank:
+                move = _colour(f"v{new_rank - old_rank}", "grey", ansi_on)
+            else:
+                move = _colour("=", "grey", ansi_on)
+            res += (
+                f"{new_rank:>3}) "
+                + " " * (score_offset - len(str(new_score)))
+                + f"{new_score} "
+                + _colour(f"({gained:+})", gained_colour, ansi_on)
+                + f" {move}  "
+                + _colour(row["name"], "bright_white", ansi_on)
+                + "\n"
+            )
+    if changes["joined"]:
+        res += f"\nJoined: {', '.join(changes['joined'])}\n"
+    if changes["left"]:
+        res += f"\nLeft: {', '.join(changes['left'])}\n"
+    return res
+
+
+def format_lb_summary(lb):
+    """Return a one line summary of a private leaderboard `lb`.
+
+    Args:
+        lb (dict): Leaderboard to summarise.
+
+    Returns:
+        summary_str (str): The number of members, and the leading member and their score.
+    """
+    if not lb["members"]:
+        return "0 members"
+    top = max(lb["members"].values(), key=lambda member: member["local_score"])
+    name = top["name"] if top["name"] is not None else f"anonymous user #{top['id']}"
+    return (
+        f"{len(lb['members'])} member{'s' if len(lb['members']) != 1 else ''}, "
+        + f"top: {name} ({top['local_score']})"
+    )
+
+
+def format_cache_stats(stats):
+    """Return a table of the size and usage of the cache.
+
+    Args:
+        stats (dict): Usage of each category of cache entry, as returned by `cache.stats`.
+
+    Returns:
+        stats_str (str): A row for each category and a total, giving the entries, their size, the hit ratio of reads
+            of them, and how much space could be reclaimed by pruning them.
+    """
+    total = {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "reclaimable": 0}
+    rows = []
+    for name, stat in sorted(stats.items()) + [("total", total)]:
+        for field in total if name != "total" else []:
+            total[field] += stat[field]
+        reads = stat["hits"] + stat["misses"]
+        rows.append(
+            [
+                name,
+                str(stat["entries"]),
+                format_size(stat["bytes"]),
+                f"{stat['hits'] / reads:.0%}" if reads else "-",
+                format_size(stat["reclaimable"]),
+            ]
+        )
+    header = ["category", "entries", "size", "hit ratio", "reclaimable"]
+    widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+    return "\n".join(
+        row[0].ljust(widths[0])
+        + "".join(f"  {cell.rjust(width)}" for cell, width in zip(row[1:], widths[1:]))
+        for row in [header] + rows
+    )
+
+
 def format_glob_lb(lb, cached, ansi_on):
     """Return a string representing a global leaderboard `lb`.
 
@@ -221,6 +352,60 @@ def format_glob_lb(lb, cached, ansi_on):
     return res
 
 
+def format_progress(stars, ansi_on):
+    """Return a string representing star completion for every event.
+
+    Args:
+        stars (dict): Star bitmap (as returned by `api.get_stars`) for each year.
+        ansi_on (bool): Whether to use ANSI colour codes.
+
+    Returns:
+        progress_str (str): A 'pretty' string representing progress in each year.
+    """
+    max_days = max(api.get_max_day(year) for year in stars)
+    l_offset = 4 + 2
+
+    res = "\n"
+    res += (
+        " " * l_offset
+        + "".join(
+            [
+                (str(day // 10) if day >= 10 else " ") + " "
+                for day in range(1, max_days + 1)
+            ]
+        )
+        + "\n"
+    )
+    res += (
+        " " * l_offset
+        + "".join([str(day)[-1] + " " for day in range(1, max_days + 1)])
+        + "\n"
+    )
+
+    for year in sorted(stars):
+        res += _colour(str(year), "bright_white", ansi_on) + "  "
+        no_days = api.get_max_day(year)
+        for day in range(1, max_days + 1):
+            day_stars = (stars[year] >> 2 * (day - 1)) & 0b11
+            if day > no_days:
+                res += "  "
+            elif day_stars == 0b11:
+                res += _colour("* ", "bright_yellow", ansi_on)
+            elif day_stars:
+                res += _colour("* ", "bright_blue", ansi_on, alt_text="- ")
+            elif day <= api.get_most_recent_day(year):
+                res += _colour("* ", "bright_grey", ansi_on, alt_text=". ")
+            else:
+                res += "  "
+        res += (
+            "  "
+            + _colour(f"{bin(stars[year]).count('1')}/{2 * no_days}", "grey", ansi_on)
+            + "\n"
+        )
+
+    return res
+
+
 def format_puzzle(puzzle, day, year, part, ansi_on):
     """Return a string displaying the puzzle text for `puzzle`.
 
@@ -359,6 +544,22 @@ def format_time(seconds):
         return f"{seconds // 3600}h {(seconds % 3600) // 60}m {seconds % 60}s"
 
 
+def format_size(size):
+    """Formats a size in bytes with a binary unit, e.g. '1.5 KiB'.
+
+    Args:
+        size (int): Size in bytes.
+
+    Returns:
+        string (str): Formatted size string.
+    """
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
 def recolour_for_pager(input):
     """Recolour ANSI colour codes in `output` to be compatible with pagers like less.
 
@@ -0,0 +1,385 @@
+import bisect
+import copy
+import json
+import os
+import tempfile
+
+from aocstat.lock import locked
+from aocstat.store import HISTORY_DIR
+
+
+def _paths(path, yr, id):
+    base = os.path.join(path, HISTORY_DIR, f"{yr}_{id}")
+    return f"{base}.log", f"{base}.tip", f"{base}.lock"
+
+
+def _derived(member):
+    # the fields of a member that follow from its stars
+    days = member["completion_day_level"]
+    return {
+        "stars": sum(len(parts) for parts in days.values()),
+        "last_star_ts": max(
+            (star["get_star_ts"] for parts in days.values() for star in parts.values()),
+            default=0,
+        ),
+    }
+
+
+def diff(old, new):
+    """Gets what changed between two copies of a private board, member by member. Only the fields of a member that
+    changed are kept and, since stars are only ever earned, only the stars that are new. A member's star count and
+    last star time are left out when their stars changed, as long as `apply` can work them out again.
+
+    Args:
+        old (dict): Raw leaderboard data.
+        new (dict): Raw leaderboard data, fetched later.
+
+    Returns:
+        delta (dict): Changed board fields (`board`), changed (or new) members by id (`members`) and the ids of members
+            that left or have to be replaced outright (`left`). Empty if nothing changed.
+    """
+    delta = {}
+    board = {k: v for k, v in new.items() if k != "members" and old.get(k, None) != v}
+    if board:
+        delta["board"] = board
+    members = {}
+    left = [id for id in old["members"] if id not in new["members"]]
+    for id, member in new["members"].items():
+        prev = old["members"].get(id)
+        if prev == member:
+            continue
+        if prev is None:
+            members[id] = member
+            continue
+        days = member["completion_day_level"]
+        prev_days = prev["completion_day_level"]
+        if any(
+            part not in days.get(day, {})
+            for day in prev_days
+            for part in prev_days[day]
+        ):
+            # a star was taken away, which only happens if a board is reset
+            left.append(id)
+            members[id] = member
+            continue
+        changed = {
+            k: v
+            for k, v in member.items()
+            if k != "completion_day_level" and prev.get(k, None) != v
+        }
+        if days != prev_days:
+            # `apply` works these out again from the stars, unless they don't add up
+            for k, v in _derived(member).items():
+                if k not in prev or k not in member:
+                    continue
+                if member[k] == v:
+                    changed.pop(k, None)
+                else:
+                    changed[k] = member[k]
+        stars = {}
+        for day, parts in days.items():
+            new_parts = {
+                part: star
+                for part, star in parts.items()
+                if part not in prev_days.get(day, {})
+            }
+            if new_parts:
+                stars[day] = new_parts
+        if stars:
+            changed["completion_day_level"] = stars
+        members[id] = changed
+    if members:
+        delta["members"] = members
+    if left:
+        delta["left"] = left
+    return delta
+
+
+def apply(lb, delta):
+    """Applies a delta from `diff` to a copy of a board, in place.
+
+    Args:
+        lb (dict): Raw leaderboard data.
+        delta (dict): Changes to apply.
+
+    Returns:
+        lb (dict): `lb`, as it was when the delta was taken.
+    """
+    lb.update(delta.get("board", {}))
+    for id in delta.get("left", []):
+        lb["members"].pop(id, None)
+    for id, changed in delta.get("members", {}).items():
+        if id not in lb["members"]:
+            lb["members"][id] = copy.deepcopy(changed)
+            continue
+        member = lb["members"][id]
+        if "completion_day_level" in changed:
+            for day, parts in changed["completion_day_level"].items():
+                member["completion_day_level"].setdefault(day, {}).update(parts)
+            member.update({k: v for k, v in _derived(member).items() if k in member})
+        for k, v in changed.items():
+            if k != "completion_day_level":
+                member[k] = v
+    return lb
+
+
+def _read_tip(tip_path):
+    try:
+        with open(tip_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_tip(tip_path, tip):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(tip_path), prefix=".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(tip, f)
+        os.replace(tmp_path, tip_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def record(path, yr, id, lb, time):
+    """Appends a copy of a private board to its history. Only what changed since the last copy is written, except
+    for a full checkpoint whenever the deltas written since the last one add up to its size. This keeps the log to
+    at most about twice the size of its deltas, and any past copy can be rebuilt from one checkpoint and deltas no
+    larger than it. The latest copy and the offset of every checkpoint are kept beside the log, so recording never
+    reads the log.
+
+    Args:
+        path (str): Data directory.
+        yr (int): Year of the event.
+        id (int): Board id.
+        lb (dict): Raw leaderboard data.
+        time (float): Unix time the board was fetched.
+
+    Returns:
+        recorded (bool): False if the board hadn't changed, so nothing was written.
+    """
+    log_path, tip_path, lock_path = _paths(path, yr, id)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with locked(lock_path):
+        tip = _read_tip(tip_path)
+        if tip is not None and time <= tip["time"]:
+            return False
+        delta = None if tip is None else diff(tip["board"], lb)
+        if delta == {}:
+            return False
+        if delta is not None:
+            line = json.dumps({"time": time, "delta": delta}) + "\n"
+        if delta is None or tip["since"] + len(line) >= tip["size"]:
+            line = json.dumps({"time": time, "checkpoint": lb}) + "\n"
+            delta = None
+        with open(log_path, "ab") as f:
+            offset = f.tell()
+            f.write(line.encode())
+        if delta is None:
+            checkpoints = [] if tip is None else tip["checkpoints"]
+            tip = {
+                "checkpoints": checkpoints + [[time, offset]],
+                "size": len(line),
+                "since": 0,
+            }
+        else:
+            tip["since"] += len(line)
+        tip["time"] = time
+        tip["board"] = lb
+        _write_tip(tip_path, tip)
+    return True
+
+
+def recorded(path, yr, id):
+    """Checks whether any copy of a private board was recorded, without reading it.
+
+    Args:
+        path (str): Data directory.
+        yr (int): Year of the event.
+        id (int): Board id.
+
+    Returns:
+        recorded (bool): Whether `snapshot` has a copy to rebuild.
+    """
+    return os.path.exists(_paths(path, yr, id)[1])
+
+
+def _replay(path, yr, id, since, until):
+    log_path, tip_path, _ = _paths(path, yr, id)
+    tip = _read_tip(tip_path)
+    if tip is None:
+        return
+    times = [time for time, _ in tip["checkpoints"]]
+    start = max(bisect.bisect_right(times, since) - 1, 0)
+    with open(log_path, "rb") as f:
+        f.seek(tip["checkpoints"][start][1])
+        for line in f:
+            if not line.endswith(b"\n"):
+                # still being written
+                return
+            entry = json.loads(line)
+            if entry["time"] > until:
+                return
+            yield entry
+
+
+def snapshot(path, yr, id, time=None):
+    """Rebuilds a private board as it was at `time`, from the nearest checkpoint before it.
+
+    Args:
+        path (str): Data directory.
+        yr (int): Year of the event.
+        id (int): Board id.
+        time (float|None): Unix time. Defaults to None, for the latest copy.
+
+    Returns:
+        board (dict|None): Raw leaderboard data, None if no copy was recorded by `time`.
+        fetched (float|None): Unix time the copy was fetched.
+    """
+    if time is None:
+        tip = _read_tip(_paths(path, yr, id)[1])
+        return (None, None) if tip is None else (tip["board"], tip["time"])
+    lb, fetched = None, None
+    for entry in _replay(path, yr, id, time, time):
+        if "checkpoint" in entry:
+            lb = entry["checkpoint"]
+        elif lb is not None:
+            apply(lb, entry["delta"])
+        fetched = entry["time"] if lb is not None else None
+    return lb, fetched
+
+
+def deltas(path, yr, id, since, until=float("inf")):
+    """Gets the recorded changes to a private board between two times, without rebuilding it at each of them.
+    Checkpoints in between are turned back into deltas against the copy before them.
+
+    Args:
+        path (str): Data directory.
+        yr (int): Year of the event.
+        id (int): Board id.
+        since (float): Unix time, exclusive.
+        until (float): Unix time, inclusive. Defaults to the latest copy.
+
+    Returns:
+        base (dict|None): Raw leaderboard data as it was at `since` (or, if nothing was recorded by then, the first
+            copy after it). None if nothing was recorded by `until`.
+        fetched (float|None): Unix time `base` was fetched.
+        changes (list(tuple(float, dict))): Time and delta of each later copy, up to `until`.
+    """
+    lb, base, fetched, changes = None, None, None, []
+    for entry in _replay(path, yr, id, since, until):
+        if "checkpoint" in entry:
+            if lb is not None and entry["time"] > since:
+                if base is None:
+                    base = copy.deepcopy(lb)
+                changes.append((entry["time"], diff(lb, entry["checkpoint"])))
+            lb = entry["checkpoint"]
+        elif lb is not None:
+            if entry["time"] > since:
+                if base is None:
+                    base = copy.deepcopy(lb)
+                changes.append((entry["time"], entry["delta"]))
+            apply(lb, entry["delta"])
+        else:
+            continue
+        if base is None:
+            fetched = entry["time"]
+    if base is None:
+        base = lb
+    return base, fetched, changes
+
+
+def _name(member):
+    return member["name"] or f"anonymous user #{member['id']}"
+
+
+def _rank(scores, score):
+    # competition ranking, `scores` ascending
+    return len(scores) - bisect.bisect_right(scores, score) + 1
+
+
+def changes(path, yr, id, since):
+    """Gets what changed on a private board since `since`: the stars earned, and the score and rank of every member
+    whose score or rank changed. The recorded deltas are walked rather than two copies compared, so apart from
+    ranking (which only needs the scores, but is done for every member) the work done is proportional to the number
+    of changes.
+
+    Args:
+        path (str): Data directory.
+        yr (int): Year of the event.
+        id (int): Board id.
+        since (float): Unix time, exclusive.
+
+    Returns:
+        changes (dict|None): None if no copy of the board was recorded. Otherwise the times of the copies compared
+            (`since` and `until`), new stars as tuples of (time, name, day, part) in the order they were earned
+            (`stars`), the members whose score or rank changed with their old and new score and rank, ordered by new
+            rank (`members`), and the names of members that joined or left (`joined` and `left`).
+    """
+    base, fetched, deltas_ = deltas(path, yr, id, since)
+    if base is None:
+        return None
+    members = base["members"]
+    # the current fields of every member that changed, None if they left
+    touched = {}
+    stars = []
+    for _, delta in deltas_:
+        for member_id in delta.get("left", []):
+            touched[member_id] = None
+        for member_id, changed in delta.get("members", {}).items():
+            current = touched.get(member_id) or dict(members.get(member_id, {}))
+            current.update(changed)
+            touched[member_id] = current
+            for day, parts in changed.get("completion_day_level", {}).items():
+                for part, star in parts.items():
+                    stars.append(
+                        (star["get_star_ts"], _name(current), int(day), int(part))
+                    )
+
+    old_scores = sorted(member["local_score"] for member in members.values())
+    new_scores = list(old_scores)
+    for member_id, current in touched.items():
+        if member_id in members:
+            del new_scores[
+                bisect.bisect_left(new_scores, members[member_id]["local_score"])
+            ]
+        if current is not None:
+            bisect.insort(new_scores, current["local_score"])
+
+    joined, left = [], []
+    for member_id, current in touched.items():
+        old = members.get(member_id)
+        if current is None:
+            if old is not None:
+                left.append(_name(old))
+        elif old is None:
+            joined.append(_name(current))
+
+    rows = []
+    for member_id, current in {**members, **touched}.items():
+        if current is None:
+            continue
+        old = members.get(member_id)
+        old_score = None if old is None else old["local_score"]
+        rank = (
+            None if old is None else _rank(old_scores, old_score),
+            _rank(new_scores, current["local_score"]),
+        )
+        if current["local_score"] == old_score and rank[0] == rank[1]:
+            continue
+        rows.append(
+            {
+                "name": _name(current),
+                "score": (old_score, current["local_score"]),
+                "rank": rank,
+            }
+        )
+    return {
+        "since": fetched,
+        "until": deltas_[-1][0] if deltas_ else fetched,
+        "stars": sorted(stars),
+        "members": sorted(rows, key=lambda row: row["rank"][1]),
+        "joined": joined,
+        "left": left,
+    }
@@ -1,22 +1,43 @@
+import io
+import math
 import time
-import subprocess as sp
 import os.path as op
 import os
-import pydoc
 import shutil
 import sys
 
 import aocstat.api as api
 import aocstat.config as config
+import aocstat.context as context
 import aocstat.format as fmt
 import aocstat.parse as parse
+import aocstat.store as store
 
 # make ANSI colour work on win
 if sys.platform == "win32":
+    import subprocess as sp
+
     sp.run("", shell=True)
 
 
 def start(args=sys.argv[1:]):
+    # only pay for the daemon client when a daemon is listening
+    if op.exists(op.join(api.data_dir, store.SOCKET_NAME)):
+        import aocstat.daemon as daemon
+
+        code = daemon.forward(args)
+        if code is not None:
+            sys.exit(code)
+    run(args)
+
+
+def run(args, client=False):
+    ctx = context.new()
+    if client:
+        # the daemon is answering a client: it can't wait on Advent of Code, or prompt or page in the client's place
+        ctx.interactive = False
+        ctx.cache_only = True
+        ctx.defer_output = True
     if not op.exists(api.data_dir):
         os.mkdir(api.data_dir)
     if not op.exists(config.config_dir):
@@ -24,14 +45,50 @@ def start(args=sys.argv[1:]):
 
     args = parse.parse_base(args)
 
+    try:
+        _dispatch(args)
+    except api.OfflineError as e:
+        print(f"{e} No cached data is available for this command.", file=sys.stderr)
+        sys.exit(1)
+    except api.RateLimitedError as e:
+        print(f"{e} No cached data is available for this command.", file=sys.stderr)
+        sys.exit(1)
+    else:
+        for e in context.current().rate_limited:
+            print(f"{e} Showing cached data.", file=sys.stderr)
+    finally:
+        import aocstat.cache as cache
+
+        cache.record_usage()
+        if context.current().cache_writes:
+            cache.prune()
+        if config.get("report_latency"):
+            _report_latency()
+
+
+def _dispatch(args):
     if args["subcommand"] == "lb":
         _lb(args=args["subcommand args"])
     elif args["subcommand"] == "purge":
         _purge(args=args["subcommand args"])
+    elif args["subcommand"] == "cache":
+        _cache(args=args["subcommand args"])
     elif args["subcommand"] == "config":
         _config(args=args["subcommand args"])
     elif args["subcommand"] == "pz":
         _pz(args=args["subcommand args"])
+    elif args["subcommand"] == "progress":
+        _progress(args=args["subcommand args"])
+    elif args["subcommand"] == "ratelimit":
+        _ratelimit(args=args["subcommand args"])
+    elif args["subcommand"] == "daemon":
+        _daemon(args=args["subcommand args"])
+    elif args["subcommand"] == "serve":
+        _serve(args=args["subcommand args"])
+    elif args["subcommand"] == "proxy":
+        _proxy(args=args["subcommand args"])
+    elif args["subcommand"] == "metrics":
+        _metrics(args=args["subcommand args"])
 
 
 def _lb(args=sys.argv[1:]):
@@ -47,17 +104,15 @@ def _lb(args=sys.argv[1:]):
 def _select_lb(args):
     args = parse.parse_select_lb(args)
     lb_ids = api.get_lb_ids()
-    lbs = [
-        api.get_priv_lb(lb_id, api.get_most_recent_year(), force_update=args["force"])[
-            0
-        ]
-        for lb_id in lb_ids
-    ]
     print("Select a private leaderboard to set as default:")
-    for local_id, lb in enumerate(lbs):
-        print(
-            f"{local_id}: {[lb['members'][member]['name'] for member in lb['members']]}"
-        )
+    for done, (lb_id, lb, cached) in enumerate(
+        api.get_priv_lbs(
+            lb_ids, api.get_most_recent_year(), force_update=args["force"]
+        ),
+        start=1,
+    ):
+        progress = "" if cached else f"  [{done}/{len(lb_ids)}]"
+        print(f"{lb_ids.index(lb_id)}: {fmt.format_lb_summary(lb)}{progress}")
     valid = False
     selection = None
     while not valid:
@@ -77,10 +132,41 @@ def _select_lb(args):
 def _priv_lb(args):
     args = parse.parse_priv_lb(args)
     ids = api.get_lb_ids()
-    if ids:
+    if ids and args["since"] is not None:
+        output = _priv_lb_changes(ids if args["all"] else [args["id"]], args)
+    elif ids and args["all"]:
+        lbs = {
+            lb_id: (lb, cached)
+            for lb_id, lb, cached in api.get_priv_lbs(
+                ids, args["year"], force_update=args["force"]
+            )
+        }
+        for lb_id, (_, cached) in lbs.items():
+            api.mark_looked(lb_id, args["year"], cached)
+        if args["sections"]:
+            output = "\n".join(
+                f"Leaderboard {lb_id}\n"
+                + fmt.format_priv_lb(
+                    *lbs[lb_id], year=args["year"], ansi_on=not args["no_colour"]
+                )
+                for lb_id in ids
+            )
+        else:
+            # only show a cached banner if every board came from cache
+            cached = all(cached for _, cached in lbs.values()) and min(
+                cached for _, cached in lbs.values()
+            )
+            output = fmt.format_priv_lb(
+                api.merge_priv_lbs([lbs[lb_id][0] for lb_id in ids]),
+                cached,
+                year=args["year"],
+                ansi_on=not args["no_colour"],
+            )
+    elif ids:
         _lb = api.get_priv_lb(
             id=args["id"], yr=args["year"], force_update=args["force"]
         )
+        api.mark_looked(args["id"], args["year"], _lb[1])
         output = fmt.format_priv_lb(
             *_lb, year=args["year"], ansi_on=not args["no_colour"]
         )
@@ -92,6 +178,26 @@ def _priv_lb(args):
     _dynamic_page(output, args["no_pager"])
 
 
+def _priv_lb_changes(ids, args):
+    import aocstat.history as history
+
+    sections = {}
+    for lb_id, _, cached in api.get_priv_lbs(
+        ids, args["year"], force_update=args["force"]
+    ):
+        since = args["since"]
+        if since == "last":
+            since = api.get_last_look(lb_id, args["year"])
+        changes = history.changes(api.data_dir, args["year"], lb_id, since or 0)
+        api.mark_looked(lb_id, args["year"], cached)
+        sections[lb_id] = fmt.format_priv_lb_changes(
+            changes, ansi_on=not args["no_colour"]
+        )
+    if len(ids) == 1:
+        return sections[ids[0]]
+    return "\n".join(f"Leaderboard {lb_id}\n" + sections[lb_id] for lb_id in ids)
+
+
 def _glob_lb(args):
     args = parse.parse_glob_lb(args)
     _lb = api.get_glob_lb(yr=args["year"], day=args["day"], part=args["part"])
@@ -102,12 +208,101 @@ def _glob_lb(args):
     _dynamic_page(output, args["no_pager"])
 
 
+def _progress(args=sys.argv[1:]):
+    args = parse.parse_progress(args)
+    stars = api.get_all_stars(force_update=args["force"])
+    output = fmt.format_progress(stars, ansi_on=not args["no_colour"])
+    _dynamic_page(output, args["no_pager"])
+
+
+def _ratelimit(args=sys.argv[1:]):
+    args = parse.parse_ratelimit(args)
+    import aocstat.ratelimit as ratelimit
+
+    for bucket, (tokens, capacity, wait) in ratelimit.status().items():
+        print(
+            f"{bucket}: {max(tokens, 0):.1f}/{capacity} requests available"
+            + (f", next in {fmt.format_time(math.ceil(wait))}" if wait else "")
+        )
+
+
+def _daemon(args=sys.argv[1:]):
+    args = parse.parse_daemon(args)
+    import aocstat.daemon as daemon
+
+    if args["stop"]:
+        print("Daemon stopped." if daemon.stop() else "No daemon is running.")
+        return
+    try:
+        daemon.serve()
+    except OSError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+def _serve(args=sys.argv[1:]):
+    args = parse.parse_serve(args)
+    import aocstat.serve as serve
+
+    try:
+        serve.serve(args["id"], args["year"], args["host"], args["port"])
+    except KeyboardInterrupt:
+        pass
+
+
+def _proxy(args=sys.argv[1:]):
+    args = parse.parse_proxy(args)
+    import aocstat.proxy as proxy
+
+    try:
+        proxy.serve(args["upstream"], args["host"], args["port"])
+    except KeyboardInterrupt:
+        pass
+
+
+def _metrics(args=sys.argv[1:]):
+    args = parse.parse_metrics(args)
+    import aocstat.metrics as metrics
+
+    try:
+        metrics.serve(args["id"], args["year"], args["host"], args["port"])
+    except KeyboardInterrupt:
+        pass
+
+
 def _purge(args=sys.argv[1:]):
     args = parse.parse_purge(args)
     api.purge_cache()
     print("Cache purged.")
 
 
+def _cache(args=sys.argv[1:]):
+    args = parse.parse_cache(args)
+    if args["subcommand"] == "stats":
+        _cache_stats(args["subcommand args"])
+    elif args["subcommand"] == "prune":
+        _cache_prune(args["subcommand args"])
+
+
+def _cache_stats(args):
+    args = parse.parse_cache_stats(args)
+    import aocstat.cache as cache
+
+    print(fmt.format_cache_stats(cache.stats()))
+
+
+def _cache_prune(args):
+    args = parse.parse_cache_prune(args)
+    import aocstat.cache as cache
+
+    evicted, freed = cache.prune(0 if args["all"] else None)
+    print(
+        f"Evicted {len(evicted)} entr{'y' if len(evicted) == 1 else 'ies'}, freeing {fmt.format_size(freed)}."
+    )
+
+
 def _config(args=sys.argv[1:]):
     args = parse.parse_config(args)
     if args["subcommand"] == "list":
@@ -156,6 +351,8 @@ def _pz(args=sys.argv[1:]):
         _pz_input(args["subcommand args"])
     if args["subcommand"] == "submit":
         _pz_submit(args["subcommand args"])
+    if args["subcommand"] == "prefetch":
+        _pz_prefetch(args["subcommand args"])
 
 
 def _pz_view(args):
@@ -183,14 +380,33 @@ def _pz_input(args):
     args = parse.parse_pz_input(args)
     if args["set_prog"]:
         api.set_prog(args["year"], args["day"], args["part"])
-    input = api.get_input(yr=args["year"], day=args["day"])
-    output = input
-    print(output, end="")
+    _write_file(api.get_input_path(yr=args["year"], day=args["day"]))
+
+
+def _write_file(path):
+    # copy the file straight to stdout in the kernel where possible, rather than
+    # decoding it to a str and re-encoding it to print it
+    sys.stdout.flush()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        try:
+            out = sys.stdout.fileno()
+            while offset < size:
+                sent = os.sendfile(out, f.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # no sendfile (e.g. windows), or stdout isn't a file it can write to
+            f.seek(offset)
+            shutil.copyfileobj(f, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
 
 
 def _pz_submit(args):
     input_args = args
-    args = parse.parse_pz_input(args)
+    args = parse.parse_pz_submit(args)
     if args["set_prog"]:
         api.set_prog(args["year"], args["day"], args["part"])
 
@@ -224,13 +440,40 @@ def _pz_submit(args):
     print(output)
 
 
+def _pz_prefetch(args):
+    args = parse.parse_pz_prefetch(args)
+    fetched = 0
+    for yr, day, remaining in api.prefetch(args["years"]):
+        fetched += 1
+        print(f"Fetched {yr} day {day} ({remaining} left)")
+    print(
+        f"Fetched {fetched} day{'s' if fetched != 1 else ''}."
+        if fetched
+        else "Everything is already cached."
+    )
+
+
 def _dynamic_page(output, no_pager):
+    ctx = context.current()
+    if ctx.defer_output and not no_pager:
+        ctx.deferred_output = output
+        return
     if len(output.split("\n")) > shutil.get_terminal_size().lines and not no_pager:
+        import pydoc
+
         pydoc.pager(fmt.recolour_for_pager(output))
     else:
         print(output)
 
 
+def _report_latency():
+    for method, path, attempt, outcome, latency in context.current().attempts:
+        print(
+            f"{method} {path} (attempt {attempt + 1}): {outcome} in {latency * 1000:.0f}ms",
+            file=sys.stderr,
+        )
+
+
 def _countdown(seconds):
     max_len = len(f"Waiting {fmt.format_time(seconds)}")
     for i in range(seconds, 0, -1):
@@ -0,0 +1,228 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aocstat.api as api
+import aocstat.config as config
+import aocstat.policy as policy
+import aocstat.ratelimit as ratelimit
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# per member gauges, as (name, help, function of the member and its rank)
+MEMBER_GAUGES = [
+    (
+        "aocstat_member_stars",
+        "Stars earned by the member.",
+        lambda member, rank: member["stars"],
+    ),
+    (
+        "aocstat_member_local_score",
+        "Local score of the member on the board.",
+        lambda member, rank: member["local_score"],
+    ),
+    (
+        "aocstat_member_last_star_timestamp_seconds",
+        "Unix time of the member's most recent star, 0 if they have none.",
+        lambda member, rank: _last_star_ts(member),
+    ),
+    (
+        "aocstat_member_rank",
+        "Position of the member on the board, ordered by local score.",
+        lambda member, rank: rank,
+    ),
+]
+CACHE_AGE = (
+    "aocstat_board_cache_age_seconds",
+    "Seconds since the board was fetched from Advent of Code.",
+)
+
+
+def _last_star_ts(member):
+    if member.get("last_star_ts"):
+        return member["last_star_ts"]
+    return max(
+        (
+            star["get_star_ts"]
+            for day in member["completion_day_level"].values()
+            for star in day.values()
+        ),
+        default=0,
+    )
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _header(name, help):
+    return f"# HELP {name} {help}\n# TYPE {name} gauge\n"
+
+
+class Board:
+    """The gauges of a private board, kept rendered in memory. When a new copy of the board arrives only the
+    members that changed (or moved rank) have their samples rendered again, and scrapes just join what is already
+    rendered.
+
+    Args:
+        id (int): Board id.
+        yr (int): Year of the event.
+    """
+
+    def __init__(self, id, yr):
+        self.id = id
+        self.yr = yr
+        self.fetched = None
+        self.expires = 0
+        self.members = {}
+        self.ranks = {}
+        # rendered samples, by gauge then member id
+        self.samples = {name: {} for name, _, _ in MEMBER_GAUGES}
+
+    def update(self, lb, fetched):
+        """Brings the gauges up to date with a copy of the board.
+
+        Args:
+            lb (dict): Raw leaderboard data.
+            fetched (float): Unix time the copy was fetched.
+
+        Returns:
+            changed (int): Number of members whose samples were rendered again.
+        """
+        self.fetched = fetched
+        self.expires = fetched + policy.priv_lb_ttl(self.yr)
+        order = sorted(
+            lb["members"],
+            key=lambda x: lb["members"][x]["local_score"],
+            reverse=True,
+        )
+        ranks = {member_id: rank for rank, member_id in enumerate(order, 1)}
+        changed = 0
+        for member_id, member in lb["members"].items():
+            if (
+                self.members.get(member_id) == member
+                and self.ranks.get(member_id) == ranks[member_id]
+            ):
+                continue
+            changed += 1
+            name = member["name"] or f"anonymous user #{member['id']}"
+            labels = f'board="{self.id}",year="{self.yr}",member="{member_id}",name="{_label(name)}"'
+            for gauge, _, value in MEMBER_GAUGES:
+                self.samples[gauge][
+                    member_id
+                ] = f"{gauge}{{{labels}}} {value(member, ranks[member_id])}\n"
+        for member_id in self.members.keys() - lb["members"].keys():
+            changed += 1
+            for gauge in self.samples.values():
+                del gauge[member_id]
+        self.members = lb["members"]
+        self.ranks = ranks
+        return changed
+
+
+class Exposition:
+    """Prometheus text exposition of several boards. The body is joined again only after a board changes.
+
+    Args:
+        boards (list(Board)): Boards to expose.
+    """
+
+    def __init__(self, boards):
+        self.boards = boards
+        self.body = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Refreshes every board that has gone stale from `api.get_priv_lb`, which reads the cache unless it is
+        stale too. Boards are only rendered again when a new copy arrives.
+
+        Returns:
+            wait (float): Seconds until the next board goes stale.
+        """
+        for board in self.boards:
+            if time.time() < board.expires:
+                continue
+            try:
+                lb, cached = api.get_priv_lb(board.id, board.yr)
+            except (api.OfflineError, ratelimit.RateLimitedError):
+                lb, cached = None, None
+            fetched = cached or time.time()
+            if lb is None or fetched == board.fetched:
+                # nothing new to show (i.e. we're offline), try again later
+                board.expires = time.time() + config.get("ttl")
+                continue
+            with self._lock:
+                board.update(lb, fetched)
+                self.body = None
+        return max(1, min(board.expires for board in self.boards) - time.time())
+
+    def render(self):
+        """Renders the exposition. Only the cache ages are worked out afresh.
+
+        Returns:
+            text (str): Body of a scrape.
+        """
+        with self._lock:
+            if self.body is None:
+                self.body = "".join(
+                    _header(gauge, help)
+                    + "".join(
+                        "".join(board.samples[gauge].values()) for board in self.boards
+                    )
+                    for gauge, help, _ in MEMBER_GAUGES
+                )
+            body = self.body
+        now = time.time()
+        return (
+            body
+            + _header(*CACHE_AGE)
+            + "".join(
+                f'{CACHE_AGE[0]}{{board="{board.id}",year="{board.yr}"}} {now - board.fetched:.0f}\n'
+                for board in self.boards
+                if board.fetched is not None
+            )
+        )
+
+
+def _handler(exposition):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "aocstat"
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ["/", "/metrics"]:
+                self.send_error(404, "Try /metrics")
+                return
+            body = exposition.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _refresh_forever(exposition):
+    while True:
+        threading.Event().wait(exposition.refresh())
+
+
+def serve(ids, yr, host, port):
+    """Exposes gauges for private boards at `/metrics` until interrupted. Boards are refreshed in the background as
+    they go stale, so scrapes never wait on Advent of Code.
+
+    Args:
+        ids (list(int)): Ids of the boards to expose.
+        yr (int): Year of the event.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+    """
+    # authenticate up front, rather than in the background
+    api.get_cookie()
+    exposition = Exposition([Board(id, yr) for id in ids])
+    exposition.refresh()
+    threading.Thread(target=_refresh_forever, args=(exposition,), daemon=True).start()
+    with ThreadingHTTPServer((host, port), _handler(exposition)) as server:
+        print(
+            f"Serving metrics on http://{host}:{server.server_port}/metrics", flush=True
+        )
+        server.serve_forever()
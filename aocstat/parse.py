@@ -1,28 +1,77 @@
 import argparse
+import datetime as dt
 import aocstat.config as config
 import aocstat.api as api
-import importlib.metadata
 
 
-def __pz_year_arg(parser):
-    def year_type(arg):
-        if int(arg) >= 2015 and int(arg) <= api.get_most_recent_year():
-            return int(arg)
-        else:
-            raise argparse.ArgumentTypeError(
-                "The year must be after 2014, and not in the future."
-            )
+class _VersionAction(argparse.Action):
+    """Like argparse's 'version' action, but only looks the version up when it is asked for."""
+
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(
+            option_strings, dest, nargs=0, default=argparse.SUPPRESS, **kwargs
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        import importlib.metadata
+
+        parser.exit(message=importlib.metadata.version("aocstat") + "\n")
 
+
+def __year_type(arg):
+    if int(arg) >= 2015 and int(arg) <= api.get_most_recent_year():
+        return int(arg)
+    else:
+        raise argparse.ArgumentTypeError(
+            "The year must be after 2014, and not in the future."
+        )
+
+
+def __pz_year_arg(parser):
     parser.add_argument(
         "-y",
         "--year",
         action="store",
-        type=year_type,
+        type=__year_type,
         help="Year of the puzzle.",
         default=None,
     )
 
 
+def __event_year_arg(parser, help="Specify the year of the event.", default=None):
+    parser.add_argument(
+        "-y",
+        "--year",
+        action="store",
+        metavar="YEAR",
+        type=__year_type,
+        help=help,
+        default=default,
+    )
+
+
+def __server_args(parser, verb, port):
+    parser.add_argument(
+        "--id",
+        metavar="ID",
+        type=int,
+        action="append",
+        help=f"Private leaderboard id to {verb}, can be given more than once. Defaults to the configured default leaderboard.",
+        default=None,
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on. Defaults to 127.0.0.1, use 0.0.0.0 to serve other machines.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=port,
+        help=f"Port to listen on. Defaults to {port}.",
+    )
+
+
 def __pz_day_arg(parser):
     def day_type(arg):
         if int(arg) >= 1 and int(arg) <= 25:
@@ -92,20 +141,70 @@ def __columns_arg(parser):
     )
 
 
+# Resolution stage: everything below runs only after argparse has accepted the
+# arguments, so help and usage errors never touch the network. Remote-derived
+# defaults and validation are resolved together here, and they come from
+# memoized resources (the star index, the board list). That makes each one cost
+# at most a single fetch.
+
+
+def __resolve_priv_lb(parser, output):
+    ids = api.get_lb_ids()
+    if output["id"] is None:
+        output["id"] = api.get_default_lb_id()
+    elif output["id"] not in ids:
+        parser.error(
+            f"argument --id: invalid choice: {output['id']} (choose from {', '.join(str(id) for id in ids)})"
+        )
+
+
+def __resolve_priv_lbs(parser, output, verb):
+    ids = api.get_lb_ids()
+    if not ids:
+        parser.error(f"You have no private leaderboard to {verb}.")
+    if output["id"] is None:
+        output["id"] = [api.get_default_lb_id()]
+    for id in output["id"]:
+        if id not in ids:
+            parser.error(
+                f"argument --id: invalid choice: {id} (choose from {', '.join(str(id) for id in ids)})"
+            )
+
+
+def __resolve_puzzle(parser, output):
+    output["year"], output["day"], output["part"] = api.get_default_puzzle(
+        output["year"], output["day"], output["part"]
+    )
+    if output["day"] > api.get_most_recent_day(output["year"]):
+        parser.error("Day cannot be in the future.")
+
+
 def parse_base(args):
     parser = argparse.ArgumentParser(
         description="Interact with Advent of Code from your terminal."
     )
     parser.add_argument(
         "subcommand",
-        choices=["lb", "purge", "config", "pz"],
-        help="Subcommand to use. Available options are 'lb' (leaderboard), 'purge' (purge cache), 'config' (view and edit config values), or 'pz' (interact with the puzzles).",
+        choices=[
+            "lb",
+            "purge",
+            "cache",
+            "config",
+            "pz",
+            "progress",
+            "ratelimit",
+            "daemon",
+            "serve",
+            "proxy",
+            "metrics",
+        ],
+        help="Subcommand to use. Available options are 'lb' (leaderboard), 'purge' (purge cache), 'cache' (view and prune the cache), 'config' (view and edit config values), 'pz' (interact with the puzzles), 'progress' (view your stars for every event), 'ratelimit' (view the remaining request budget), 'daemon' (answer commands from a long-running process), 'serve' (serve private leaderboards over HTTP), 'proxy' (run a caching proxy to Advent of Code for a team), or 'metrics' (expose private leaderboards to Prometheus).",
     )
     parser.add_argument(
         "-v",
         "--version",
-        action="version",
-        version=importlib.metadata.version("aocstat"),
+        action=_VersionAction,
+        help="show program's version number and exit",
     )
     parser.add_argument("subcommand args", nargs=argparse.REMAINDER)
 
@@ -164,13 +263,47 @@ def parse_priv_lb(args):
 
     __no_colour_arg(parser)
 
-    parser.add_argument(
+    boards = parser.add_mutually_exclusive_group()
+    boards.add_argument(
         "--id",
         metavar="ID",
-        choices=api.get_lb_ids(),
         type=int,
-        help="Specify a private leaderboard id.",
-        default=api.get_default_lb_id(),
+        help="Specify a private leaderboard id. Defaults to the configured default leaderboard.",
+        default=None,
+    )
+    boards.add_argument(
+        "-a",
+        "--all",
+        action="store_true",
+        help="Show every private leaderboard you are a member of, merged into one.",
+    )
+    parser.add_argument(
+        "-s",
+        "--sections",
+        action="store_true",
+        help="With --all, show each leaderboard in its own section instead of merging them.",
+    )
+
+    def since_type(arg):
+        if arg == "last":
+            return arg
+        try:
+            return float(arg)
+        except ValueError:
+            pass
+        try:
+            return dt.datetime.fromisoformat(arg).timestamp()
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "Must be 'last', a Unix timestamp, or an ISO 8601 date and time (e.g. 2024-12-05T12:00)."
+            )
+
+    parser.add_argument(
+        "--since",
+        metavar="last|TIME",
+        type=since_type,
+        default=None,
+        help="Show the stars earned, and the score and rank changes, since a time instead of the board. 'last' means since the board was last shown. TIME is a Unix timestamp or an ISO 8601 date and time (local unless an offset is given). With --all, each board is shown in its own section.",
     )
 
     __force_update_arg(parser)
@@ -178,6 +311,7 @@ def parse_priv_lb(args):
     __columns_arg(parser)
 
     output = vars(parser.parse_args(args))
+    __resolve_priv_lb(parser, output)
     return output
 
 
@@ -236,16 +370,105 @@ def parse_glob_lb(args):
     __columns_arg(parser)
 
     output = vars(parser.parse_args(args))
-    output["year"], output["day"], output["part"] = api.get_default_puzzle(
-        output["year"], output["day"], output["part"]
-    )
-    if output["day"] > api.get_most_recent_day(output["year"]):
-        parser.error("Day cannot be in the future.")
+    __resolve_puzzle(parser, output)
     if output["year"] >= 2025:
         parser.error("Years 2025 and after don't have global leaderboards.")
     return output
 
 
+def parse_progress(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat progress",
+        description="View your star completion for every Advent of Code event.",
+    )
+    __no_pager_arg(parser)
+    __no_colour_arg(parser)
+    parser.add_argument(
+        "-f",
+        "--force",
+        default=False,
+        action="store_true",
+        help="Force update every event's calendar, even if cached.",
+    )
+    output = vars(parser.parse_args(args))
+    return output
+
+
+def parse_ratelimit(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat ratelimit",
+        description="View the request budget shared by every running aocstat.",
+    )
+    output = vars(parser.parse_args(args))
+    return output
+
+
+def parse_daemon(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat daemon",
+        description="Run a long-running daemon that keeps connections and cache in memory. While it is running, 'lb priv', 'lb glob', 'pz input', 'pz view' and 'progress' are answered by the daemon. Not available on Windows.",
+    )
+    parser.add_argument(
+        "--stop",
+        default=False,
+        action="store_true",
+        help="Stop the running daemon.",
+    )
+    output = vars(parser.parse_args(args))
+    return output
+
+
+def parse_serve(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat serve",
+        description="Serve private leaderboards over HTTP, as plain text (/ID.txt), ANSI colour (/ID.ansi) or JSON (/ID.json). Each board is fetched from Advent of Code at most once per ttl, however many clients there are.",
+    )
+
+    __event_year_arg(parser, default=api.get_most_recent_year())
+    __server_args(parser, "serve", 8080)
+    output = vars(parser.parse_args(args))
+    __resolve_priv_lbs(parser, output, "serve")
+    return output
+
+
+def parse_metrics(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat metrics",
+        description="Expose gauges for private leaderboards at /metrics, in the Prometheus text format: stars, local score, last star time and rank of each member, and the age of each board. Boards are refreshed in the background as they go stale, so scrapes are answered from memory.",
+    )
+
+    __event_year_arg(parser, default=api.get_most_recent_year())
+    __server_args(parser, "expose", 9180)
+    output = vars(parser.parse_args(args))
+    __resolve_priv_lbs(parser, output, "expose")
+    return output
+
+
+def parse_proxy(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat proxy",
+        description="Run a caching proxy to Advent of Code, shared by a team. Each member points aocstat at it by setting 'proxy_url'. Responses are cached per session cookie (global leaderboards once for everyone), and identical requests in flight are only made once.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on. Defaults to 127.0.0.1, use 0.0.0.0 to serve other machines.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8081,
+        help="Port to listen on. Defaults to 8081.",
+    )
+    parser.add_argument(
+        "--upstream",
+        default=api.AOC_URL,
+        help=f"Root URL to proxy. Defaults to {api.AOC_URL}.",
+    )
+    output = vars(parser.parse_args(args))
+    return output
+
+
 def parse_purge(args):
     parser = argparse.ArgumentParser(
         prog="aocstat purge", description="Purge program cache."
@@ -255,6 +478,45 @@ def parse_purge(args):
     return output
 
 
+def parse_cache(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat cache", description="View and prune program cache."
+    )
+    parser.add_argument(
+        "subcommand",
+        choices=["stats", "prune"],
+        help="Subcommand to use. Available options are 'stats' (view the size and hit ratio of the cache) or 'prune' (evict leaderboards and other data that can be fetched again).",
+    )
+    parser.add_argument("subcommand args", nargs=argparse.REMAINDER)
+    output = vars(parser.parse_args(args))
+    return output
+
+
+def parse_cache_stats(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat cache stats",
+        description="View the size and hit ratio of the cache.",
+    )
+    output = vars(parser.parse_args(args))
+    return output
+
+
+def parse_cache_prune(args):
+    parser = argparse.ArgumentParser(
+        prog="aocstat cache prune",
+        description="Evict the least recently used leaderboards and other data that can be fetched again, until the cache is within 'cache_budget'. Your cookie, puzzles and inputs are never evicted.",
+    )
+    parser.add_argument(
+        "-a",
+        "--all",
+        default=False,
+        action="store_true",
+        help="Evict everything that can be fetched again, regardless of 'cache_budget'.",
+    )
+    output = vars(parser.parse_args(args))
+    return output
+
+
 def parse_config(args):
     parser = argparse.ArgumentParser(
         prog="aocstat config", description="View and edit config values."
@@ -335,8 +597,8 @@ def parse_pz(args):
     )
     parser.add_argument(
         "subcommand",
-        choices=["view", "input", "submit"],
-        help="Subcommand to use. Available options are 'view' (view puzzle instructions), 'input' (get puzzle input), or 'submit' (submit puzzle answer).",
+        choices=["view", "input", "submit", "prefetch"],
+        help="Subcommand to use. Available options are 'view' (view puzzle instructions), 'input' (get puzzle input), 'submit' (submit puzzle answer), or 'prefetch' (download every puzzle and input for offline use).",
     )
     parser.add_argument("subcommand args", nargs=argparse.REMAINDER)
     output = vars(parser.parse_args(args))
@@ -371,13 +633,9 @@ def parse_pz_view(args):
         output["year"] is None and output["day"] is None and output["part"] is None
     )
 
-    output["year"], output["day"], output["part"] = api.get_default_puzzle(
-        output["year"], output["day"], output["part"]
-    )
-    if output["day"] > api.get_most_recent_day(output["year"]):
-        parser.error("Day cannot be in the future.")
-
-    if api.get_current_part(output["year"], output["day"]) == 1 and output["part"] == 2:
+    __resolve_puzzle(parser, output)
+    current_part = api.get_current_part(output["year"], output["day"])
+    if current_part == 1 and output["part"] == 2:
         parser.error(
             "You have to complete the previous part to interact with this puzzle."
         )
@@ -396,13 +654,9 @@ def parse_pz_input(args):
     output["set_prog"] = not (
         output["year"] is None and output["day"] is None and output["part"] is None
     )
-    output["year"], output["day"], output["part"] = api.get_default_puzzle(
-        output["year"], output["day"], output["part"]
-    )
-    if output["day"] > api.get_most_recent_day(output["year"]):
-        parser.error("Day cannot be in the future.")
-
-    if api.get_current_part(output["year"], output["day"]) == 1 and output["part"] == 2:
+    __resolve_puzzle(parser, output)
+    current_part = api.get_current_part(output["year"], output["day"])
+    if current_part == 1 and output["part"] == 2:
         parser.error(
             "You have to complete the previous part to interact with this puzzle."
         )
@@ -431,20 +685,39 @@ def parse_pz_submit(args):
     output["set_prog"] = not (
         output["year"] is None and output["day"] is None and output["part"] is None
     )
-    output["year"], output["day"], output["part"] = api.get_default_puzzle(
-        output["year"], output["day"], output["part"]
-    )
-    if output["day"] > api.get_most_recent_day(output["year"]):
-        parser.error("Day cannot be in the future.")
-
-    if api.get_current_part(output["year"], output["day"]) == 1 and output["part"] == 2:
+    __resolve_puzzle(parser, output)
+    current_part = api.get_current_part(output["year"], output["day"])
+    if current_part == 1 and output["part"] == 2:
         parser.error(
             "You have to complete the previous part to interact with this puzzle."
         )
 
-    if api.get_current_part(output["year"], output["day"]) == 2 and output["part"] == 1:
+    if current_part == 2 and output["part"] == 1:
         parser.error("You have already completed part 1 of this puzzle.")
 
-    if api.get_current_part(output["year"], output["day"]) is None:
+    if current_part is None:
         parser.error("You have already completed every part of this puzzle.")
     return output
+
+
+def parse_pz_prefetch(args):
+    parser = argparse.ArgumentParser(
+        "aocstat pz prefetch",
+        description="Download the puzzle text and input for every unlocked day, for offline use.",
+    )
+
+    years = parser.add_mutually_exclusive_group(required=True)
+    __event_year_arg(years, help="Year of the event to prefetch.")
+    years.add_argument(
+        "--all-years",
+        action="store_true",
+        help="Prefetch every event.",
+    )
+
+    output = vars(parser.parse_args(args))
+    output["years"] = (
+        list(range(2015, api.get_most_recent_year() + 1))
+        if output["all_years"]
+        else [output["year"]]
+    )
+    return output
@@ -0,0 +1,119 @@
+import datetime as dt
+import math
+from datetime import timezone
+
+import aocstat.config as config
+
+# ttl of data that can never change
+IMMUTABLE = math.inf
+# number of entries on each part of a global day board, once it is full
+GLOBAL_LB_SIZE = 100
+# how long after a day's release its global board is expected to be filling up
+RELEASE_WINDOW = dt.timedelta(hours=1)
+
+# puzzles are released at midnight EST, which is 05:00 UTC
+_EST = timezone(dt.timedelta(hours=-5))
+
+
+def _now():
+    return dt.datetime.now(_EST)
+
+
+def in_event(yr):
+    """Whether the event for `yr` is running, i.e. it is December of `yr` in EST. Outside the event, boards for `yr`
+    only change when someone solves a puzzle late.
+
+    Args:
+        yr (int): Year of the event.
+
+    Returns:
+        in_event (bool): True if the event is running.
+    """
+    now = _now()
+    return now.year == yr and now.month == 12
+
+
+def finished(yr):
+    """Whether the event for `yr` is over.
+
+    Args:
+        yr (int): Year of the event.
+
+    Returns:
+        finished (bool): True if the event is over.
+    """
+    return _now() >= dt.datetime(yr + 1, 1, 1, tzinfo=_EST)
+
+
+def in_release_window(yr, day):
+    """Whether it is the hour after `day` of `yr` was released, while its global board fills up.
+
+    Args:
+        yr (int): Year of the event.
+        day (int): Day of the event.
+
+    Returns:
+        in_window (bool): True if `day` was released less than `RELEASE_WINDOW` ago.
+    """
+    release = dt.datetime(yr, 12, day, tzinfo=_EST)
+    return release <= _now() < release + RELEASE_WINDOW
+
+
+def priv_lb_ttl(yr):
+    """Gets how long a private board stays fresh. During the event this is `ttl`, which should be no less than the
+    15 minutes Advent of Code asks for. Otherwise only late solves change the board, so it keeps for `archive_ttl`.
+
+    Args:
+        yr (int): Year of the event.
+
+    Returns:
+        ttl (float): Seconds the board stays fresh for.
+    """
+    return config.get("ttl") if in_event(yr) else config.get("archive_ttl")
+
+
+def lb_ids_ttl(yr):
+    """Gets how long the list of private boards stays fresh. Boards are rarely joined outside the event.
+
+    Args:
+        yr (int): Year of the most recent event.
+
+    Returns:
+        ttl (float): Seconds the list stays fresh for.
+    """
+    return config.get("ttl") if in_event(yr) else config.get("archive_ttl")
+
+
+def stars_ttl(yr):
+    """Gets how long a star bitmap stays fresh. Solves made through aocstat are recorded in cache as they happen, so
+    outside the event the bitmap is kept for good.
+
+    Args:
+        yr (int): Year of the event.
+
+    Returns:
+        ttl (float): Seconds the bitmap stays fresh for.
+    """
+    return config.get("ttl") if in_event(yr) else IMMUTABLE
+
+
+def glob_lb_ttl(yr, day, lb):
+    """Gets how long a global board stays fresh. The overall board is fixed once the event is over, and a day's board
+    is fixed once both parts are full. While a day's board is filling up, in the hour after the day's release, it
+    stays fresh for only `release_ttl`.
+
+    Args:
+        yr (int): Year of the event.
+        day (int|None): Day of the board, None for the overall board.
+        lb (dict): Raw leaderboard data, for a day's board keyed by part ('1' and '2').
+
+    Returns:
+        ttl (float): Seconds the board stays fresh for.
+    """
+    if day is None:
+        return IMMUTABLE if finished(yr) else config.get("ttl")
+    if all(len(lb[part]["members"]) >= GLOBAL_LB_SIZE for part in ["1", "2"]):
+        return IMMUTABLE
+    if in_release_window(yr, day):
+        return config.get("release_ttl")
+    return config.get("ttl")
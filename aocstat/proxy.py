@@ -0,0 +1,294 @@
+import collections
+import hashlib
+import math
+import re
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aocstat.config as config
+import aocstat.policy as policy
+import aocstat.ratelimit as ratelimit
+
+# paths that look the same to everyone, so are fetched without a cookie and
+# cached once for every client
+PUBLIC_PATHS = [r"/\d+/leaderboard", r"/\d+/leaderboard/day/\d+"]
+# response headers passed on to clients
+HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+# total size of the bodies kept in memory, beyond which the least recently used
+# responses are dropped
+MAX_BYTES = 64 * 2**20
+
+
+def _ttl(path):
+    """Gets how long the response for `path` stays fresh, following the same policy as the local cache.
+
+    Args:
+        path (str): Path relative to the Advent of Code root.
+
+    Returns:
+        ttl (float): Seconds the response stays fresh for.
+    """
+    if re.fullmatch(r"/\d+/day/\d+/input|/\d+/settings", path):
+        return policy.IMMUTABLE
+    match = re.fullmatch(r"/(\d+)/leaderboard/private/view/\d+\.json", path)
+    if match:
+        return policy.priv_lb_ttl(int(match.group(1)))
+    match = re.fullmatch(r"/(\d+)/leaderboard/private", path)
+    if match:
+        return policy.lb_ids_ttl(int(match.group(1)))
+    match = re.fullmatch(r"/(\d+)", path)
+    if match:
+        return policy.stars_ttl(int(match.group(1)))
+    match = re.fullmatch(r"/(\d+)/leaderboard(?:/day/(\d+))?", path)
+    if match:
+        yr = int(match.group(1))
+        if policy.finished(yr):
+            return policy.IMMUTABLE
+        if match.group(2) is not None and policy.in_release_window(
+            yr, int(match.group(2))
+        ):
+            return config.get("release_ttl")
+    return config.get("ttl")
+
+
+class Proxy:
+    """Fetches Advent of Code resources on behalf of many clients, caching responses by path and by whose cookie
+    they were fetched with. Identical requests that arrive while one is in flight wait for it, rather than being
+    made again, so every client together makes a single stream of requests upstream.
+
+    Every client is rate limited separately, as they would be without the proxy, so one member of a team never
+    spends another's budget. Requests are never held waiting on the rate limit, which would outlast the client's
+    read timeout. Once a bucket is spent, a stale response is served if there is one, otherwise a 429 with
+    `Retry-After`.
+
+    Args:
+        upstream (str): Root URL to fetch from.
+        max_bytes (int, optional): Total size of the bodies to keep. Defaults to `MAX_BYTES`.
+    """
+
+    def __init__(self, upstream, max_bytes=MAX_BYTES):
+        import http.cookiejar
+
+        import requests as rq
+        from requests.adapters import HTTPAdapter
+
+        self.upstream = upstream.rstrip("/")
+        self.session = rq.Session()
+        self.session.mount(
+            "https://", HTTPAdapter(pool_maxsize=config.get("pool_size"))
+        )
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=config.get("pool_size")))
+        self.session.headers["User-Agent"] = (
+            "aocstat proxy (+https://github.com/hectorBrown/aocstat)"
+        )
+        # cookies are passed through per request, and never kept between them
+        self.session.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        )
+        # least recently used first
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.flights = {}
+        self.upstream_requests = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _client(cookie):
+        return None if cookie is None else hashlib.sha256(cookie.encode()).hexdigest()
+
+    @classmethod
+    def _scope(cls, path, cookie):
+        if any(re.fullmatch(pattern, path) for pattern in PUBLIC_PATHS):
+            return None
+        return cls._client(cookie)
+
+    def _remember(self, key, response):
+        # with self._lock held
+        self._forget(key)
+        self.entries[key] = response
+        self.size += len(response["body"])
+        while self.size > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.size -= len(dropped["body"])
+
+    def _forget(self, key):
+        # with self._lock held
+        dropped = self.entries.pop(key, None)
+        if dropped is not None:
+            self.size -= len(dropped["body"])
+
+    def _fetch(self, method, path, cookie, cached=None, body=None, content_type=None):
+        headers = {} if cookie is None else {"Cookie": f"session={cookie}"}
+        if content_type is not None:
+            headers["Content-Type"] = content_type
+        if cached is not None and cached["headers"].get("ETag") is not None:
+            headers["If-None-Match"] = cached["headers"]["ETag"]
+        if cached is not None and cached["headers"].get("Last-Modified") is not None:
+            headers["If-Modified-Since"] = cached["headers"]["Last-Modified"]
+        try:
+            ratelimit.acquire(
+                ratelimit.bucket(method, path, self._client(cookie)), block=False
+            )
+        except ratelimit.RateLimitedError as e:
+            if cached is not None:
+                return cached
+            return {
+                "time": time.time(),
+                "status": 429,
+                "headers": {
+                    "Content-Type": "text/plain; charset=utf-8",
+                    "Retry-After": str(math.ceil(e.wait)),
+                },
+                "body": f"{e}\n".encode(),
+            }
+        with self._lock:
+            self.upstream_requests += 1
+        res = self.session.request(
+            method,
+            f"{self.upstream}{path}",
+            headers=headers,
+            data=body,
+            timeout=(config.get("connect_timeout"), config.get("read_timeout")),
+        )
+        if res.status_code == 304 and cached is not None:
+            return dict(cached, time=time.time())
+        return {
+            "time": time.time(),
+            "status": res.status_code,
+            "headers": {
+                name: res.headers[name] for name in HEADERS if name in res.headers
+            },
+            "body": res.content,
+        }
+
+    def get(self, path, cookie):
+        """Gets `path`, from cache if it is fresh, otherwise from upstream (revalidating any cached response).
+
+        Args:
+            path (str): Path relative to the Advent of Code root.
+            cookie (str|None): Session cookie of the client.
+
+        Returns:
+            response (dict): The `status`, `headers` and `body` of the response, and the `time` it was fetched.
+        """
+        scope = self._scope(path, cookie)
+        key = (path, scope)
+        with self._lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                if time.time() - cached["time"] <= _ttl(path):
+                    return cached
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Future()
+        if not leader:
+            return flight.result()
+
+        try:
+            response = self._fetch("GET", path, cookie if scope else None, cached)
+        except BaseException as e:
+            with self._lock:
+                del self.flights[key]
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            # cache before landing, so nothing arriving in between fetches again
+            if response["status"] == 200:
+                self._remember(key, response)
+            del self.flights[key]
+        flight.set_result(response)
+        return response
+
+    def post(self, path, cookie, body, content_type):
+        """Passes a POST (i.e. submitting an answer) straight through. The client's cached page for the day and its
+        calendar are dropped, since both change when an answer is right.
+
+        Args:
+            path (str): Path relative to the Advent of Code root.
+            cookie (str|None): Session cookie of the client.
+            body (bytes): Request body.
+            content_type (str|None): Content type of `body`.
+
+        Returns:
+            response (dict): As for `get`.
+        """
+        response = self._fetch(
+            "POST", path, cookie, body=body, content_type=content_type
+        )
+        match = re.fullmatch(r"/(\d+)/day/(\d+)/answer", path)
+        if match:
+            scope = self._scope(path, cookie)
+            with self._lock:
+                for stale in [f"/{match[1]}/day/{match[2]}", f"/{match[1]}"]:
+                    self._forget((stale, scope))
+        return response
+
+
+def _handler(proxy):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "aocstat"
+
+        def _cookie(self):
+            match = re.search(
+                r"(?:^|;\s*)session=([^;]+)", self.headers.get("Cookie", "")
+            )
+            return match[1] if match else None
+
+        def _respond(self, response):
+            etag = response["headers"].get("ETag")
+            if etag is not None and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(response["status"])
+            for name, value in response["headers"].items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(response["body"])))
+            self.end_headers()
+            self.wfile.write(response["body"])
+
+        def _upstream_error(self, e):
+            self.send_error(502, f"Couldn't reach Advent of Code ({e}).")
+
+        def do_GET(self):
+            import requests as rq
+
+            try:
+                response = proxy.get(self.path, self._cookie())
+            except (rq.exceptions.ConnectionError, rq.exceptions.Timeout) as e:
+                self._upstream_error(e)
+                return
+            self._respond(response)
+
+        def do_POST(self):
+            import requests as rq
+
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                response = proxy.post(
+                    self.path, self._cookie(), body, self.headers.get("Content-Type")
+                )
+            except (rq.exceptions.ConnectionError, rq.exceptions.Timeout) as e:
+                self._upstream_error(e)
+                return
+            self._respond(response)
+
+    return Handler
+
+
+def serve(upstream, host, port):
+    """Runs the proxy until interrupted. Point aocstat at it with the `proxy_url` config value.
+
+    Args:
+        upstream (str): Root URL to fetch from.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+    """
+    with ThreadingHTTPServer((host, port), _handler(Proxy(upstream))) as server:
+        print(f"Proxying {upstream} on http://{host}:{server.server_port}/", flush=True)
+        server.serve_forever()
@@ -0,0 +1,120 @@
+import re
+import time
+
+import aocstat.api as api
+import aocstat.config as config
+from aocstat.lock import locked
+
+# (capacity, tokens refilled per second) for each class of endpoint. Every
+# private board has a bucket of its own, allowing one request per board every 15
+# minutes as Advent of Code asks.
+BUCKETS = {
+    "priv_lb": (1, 1 / 900),
+    "submit": (3, 1 / 30),
+    "page": (10, 1 / 5),
+}
+# longest a request waits for a token before giving up, in seconds
+MAX_WAIT = 30
+
+# raised by `acquire`. It lives in api, so that fetchers can catch it without
+# importing this module.
+RateLimitedError = api.RateLimitedError
+
+
+def bucket(method, path, client=None):
+    """Gets the bucket a request takes a token from: one for each private board, and one for each other class of
+    endpoint.
+
+    Args:
+        method (str): HTTP method.
+        path (str): Path relative to the Advent of Code root.
+        client (str|None, optional): Whose request it is, when requests are made on behalf of several people (i.e.
+            by the proxy). Each of them gets buckets of their own. Defaults to None.
+
+    Returns:
+        bucket (str): Name of the bucket, which starts with a key of `BUCKETS`.
+    """
+    match = re.search(r"/leaderboard/private/view/(\d+)", path)
+    if match:
+        name = f"priv_lb_{match[1]}"
+    elif method == "POST":
+        name = "submit"
+    else:
+        name = "page"
+    return name if client is None else f"{name}@{client}"
+
+
+def _endpoint_class(bucket):
+    bucket = bucket.split("@")[0]
+    return "priv_lb" if bucket.startswith("priv_lb") else bucket
+
+
+def _refill(state, endpoint_class, now):
+    capacity, rate = BUCKETS[endpoint_class]
+    if state is None:
+        return {"tokens": capacity, "time": now}
+    return {
+        "tokens": min(capacity, state["tokens"] + (now - state["time"]) * rate),
+        "time": now,
+    }
+
+
+def acquire(bucket, block=True):
+    """Takes a token from `bucket`, shared by every aocstat process through the data dir. A request never waits
+    longer than `MAX_WAIT` for a token, so e.g. refetching a private board that was fetched a minute ago fails
+    rather than sleeping for the rest of its 15 minutes.
+
+    Args:
+        bucket (str): Name of the bucket, as returned by `bucket`.
+        block (bool, optional): Wait (up to `MAX_WAIT`) for a token if none is available. Otherwise raise. Defaults
+            to True.
+
+    Raises:
+        RateLimitedError: If no token is available and `block` is False, or the wait would be longer than `MAX_WAIT`.
+
+    Returns:
+        wait (float): How long was waited for a token, in seconds.
+    """
+    if not config.get("rate_limit"):
+        return 0
+    endpoint_class = _endpoint_class(bucket)
+    with locked(f"{api.data_dir}/ratelimit_{bucket}.lock"):
+        state = _refill(
+            api._read_cache(f"ratelimit_{bucket}"), endpoint_class, time.time()
+        )
+        wait = max(0, (1 - state["tokens"]) / BUCKETS[endpoint_class][1])
+        if wait and (not block or wait > MAX_WAIT):
+            raise RateLimitedError(bucket, wait)
+        # take the token now (possibly going into debt) so that concurrent waiters queue up behind us
+        state["tokens"] -= 1
+        api._write_cache(f"ratelimit_{bucket}", state)
+    time.sleep(wait)
+    return wait
+
+
+def status():
+    """Gets the current budget of every bucket that has been used, for diagnostics.
+
+    Returns:
+        status (dict): For each bucket, a tuple of the tokens available, the bucket's capacity, and the wait (in
+            seconds) before the next request would be allowed.
+    """
+    output = {}
+    now = time.time()
+    buckets = [
+        key[len("ratelimit_") :]
+        for key in sorted(api._store().keys())
+        # not those the proxy keeps for its clients
+        if key.startswith("ratelimit_priv_lb_") and "@" not in key
+    ]
+    for bucket in buckets + ["submit", "page"]:
+        capacity, rate = BUCKETS[_endpoint_class(bucket)]
+        state = _refill(
+            api._read_cache(f"ratelimit_{bucket}"), _endpoint_class(bucket), now
+        )
+        output[bucket] = (
+            state["tokens"],
+            capacity,
+            max(0, (1 - state["tokens"]) / rate),
+        )
+    return output
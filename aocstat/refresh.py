@@ -0,0 +1,35 @@
+import sys
+
+import aocstat.api as api
+import aocstat.context as context
+
+# Run detached by `api._refresh_in_background` as
+#   python -m aocstat.refresh priv_lb SPAWNED YEAR ID [ID ...]
+# to bring stale cache entries up to date for the next invocation, while the one
+# that started it carries on with what was cached. SPAWNED is the unix time it
+# was started, so entries written since (or still fresh) aren't fetched again.
+
+
+def refresh(args):
+    """Refreshes the cache entries described by `args`.
+
+    Args:
+        args (list(str)): The kind of entry and the unix time the refresh was spawned, followed by which entries.
+    """
+    # never start an interactive login from the background
+    context.new().interactive = False
+    spawned = float(args[1])
+    if args[0] == "priv_lb":
+        yr = int(args[2])
+        for id in args[3:]:
+            try:
+                api._fetch_priv_lb(
+                    int(id), yr, api._read_cache(f"lb_{yr}_{id}"), since=spawned
+                )
+            except api.LoginRequiredError:
+                # the stale copy is kept, until the next invocation in the foreground logs in again
+                return
+
+
+if __name__ == "__main__":
+    refresh(sys.argv[1:])
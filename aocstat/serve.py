@@ -0,0 +1,123 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aocstat.api as api
+import aocstat.format as fmt
+import aocstat.policy as policy
+import aocstat.ratelimit as ratelimit
+
+# content type of each format boards are rendered in, by extension
+FORMATS = {
+    "txt": "text/plain; charset=utf-8",
+    "ansi": "text/plain; charset=utf-8",
+    "json": "application/json",
+}
+
+
+class Board:
+    """A private board, rendered in every format and kept in memory until it goes stale. However many clients ask
+    for it, it is fetched (or revalidated) upstream at most once per ttl.
+
+    Args:
+        id (int): Board id.
+        yr (int): Year of the event.
+    """
+
+    def __init__(self, id, yr):
+        self.id = id
+        self.yr = yr
+        self.rendered = None
+        self.expires = 0
+        self._refreshing = threading.Lock()
+
+    def _refresh(self):
+        lb, cached = api.get_priv_lb(self.id, self.yr)
+        fetched = cached or time.time()
+        bodies = {
+            "txt": fmt.format_priv_lb(lb, fetched, year=self.yr, ansi_on=False),
+            "ansi": fmt.format_priv_lb(lb, fetched, year=self.yr, ansi_on=True),
+            "json": json.dumps(lb),
+        }
+        self.rendered = {
+            ext: (body.encode(), hashlib.sha256(body.encode()).hexdigest()[:16])
+            for ext, body in bodies.items()
+        }
+        self.expires = fetched + policy.priv_lb_ttl(self.yr)
+
+    def get(self, ext):
+        """Gets the board rendered in a format. A stale board is served as is while another request refreshes it, so
+        only the first request after it goes stale waits on Advent of Code.
+
+        Args:
+            ext (str): A key of `FORMATS`.
+
+        Returns:
+            body (bytes): The rendered board.
+            etag (str): Validator for `body`.
+            max_age (int): Seconds until the board goes stale.
+        """
+        if time.time() >= self.expires or self.rendered is None:
+            if self._refreshing.acquire(blocking=self.rendered is None):
+                try:
+                    if time.time() >= self.expires or self.rendered is None:
+                        self._refresh()
+                finally:
+                    self._refreshing.release()
+        body, etag = self.rendered[ext]
+        return body, etag, max(0, int(self.expires - time.time()))
+
+
+def _handler(boards):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "aocstat"
+
+        def do_GET(self):
+            match = re.fullmatch(r"/(?:(\d+)(?:\.(\w+))?)?", self.path.split("?")[0])
+            if match is None:
+                id, ext = None, None
+            else:
+                id = int(match.group(1)) if match.group(1) else next(iter(boards))
+                ext = match.group(2) or "txt"
+            if id not in boards or ext not in FORMATS:
+                self.send_error(404, f"Try /{'.txt, /'.join(map(str, boards))}.txt")
+                return
+            try:
+                body, etag, max_age = boards[id].get(ext)
+            except (api.OfflineError, ratelimit.RateLimitedError) as e:
+                self.send_error(503, str(e))
+                return
+            if self.headers.get("If-None-Match") == f'"{etag}"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", FORMATS[ext])
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", f'"{etag}"')
+            self.send_header("Cache-Control", f"max-age={max_age}")
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(ids, yr, host, port):
+    """Serves private boards over HTTP until interrupted. Each board is available at `/{id}.txt`, `/{id}.ansi` and
+    `/{id}.json`, and `/` is the first board as plain text.
+
+    Args:
+        ids (list(int)): Ids of the boards to serve.
+        yr (int): Year of the event.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+    """
+    # authenticate up front, rather than in whichever request comes first
+    api.get_cookie()
+    boards = {id: Board(id, yr) for id in ids}
+    with ThreadingHTTPServer((host, port), _handler(boards)) as server:
+        print(f"Serving on http://{host}:{server.server_port}/", flush=True)
+        server.serve_forever()
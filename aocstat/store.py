@@ -0,0 +1,453 @@
+import _thread
+import os
+import pickle
+import re
+import time
+
+# tempfile, threading and hashlib are only needed to write, so are imported where
+# they are used. This keeps fully cached commands fast.
+
+# name of the SQLite database file in the data dir
+DB_NAME = "cache.sqlite3"
+# directory in the data dir holding raw bodies, named by their sha256
+BLOB_DIR = "blobs"
+# directory in the data dir holding the history of every private board
+HISTORY_DIR = "history"
+# Unix domain socket in the data dir the daemon listens on
+SOCKET_NAME = "daemon.sock"
+
+# tables with a structured key: (table, key pattern, key format, key columns)
+TABLES = [
+    ("leaderboards", r"lb_(\d+)_(\d+)", "lb_{}_{}", ("year", "id")),
+    ("global_boards", r"glb_(\d+)_(\d+)", "glb_{}_{}", ("year", "day")),
+    ("puzzles", r"pz_(\d+)_(\d+)_(\d+)", "pz_{}_{}_{}", ("year", "day", "part")),
+    ("inputs", r"in_(\d+)_(\d+)", "in_{}_{}", ("year", "day")),
+]
+# every other entry (cookie, id, progress, star bitmaps, ...) goes here, keyed by name
+META_TABLE = "meta"
+
+_stores = {}
+# the same lock as threading.Lock(), without importing threading
+_stores_lock = _thread.allocate_lock()
+_memoized = False
+
+
+def _is_entry(name):
+    """Whether the file `name` in the data dir is a cache entry, rather than a lock, socket, temporary file, database or
+    directory."""
+    return not (
+        name.startswith(".")
+        or name.endswith(".lock")
+        or name.startswith(DB_NAME)
+        or name.endswith(".sock")
+        or name == BLOB_DIR
+        or name == HISTORY_DIR
+    )
+
+
+class PickleStore:
+    """Stores each cache entry as a pickle file in a directory, named by its key.
+
+    Args:
+        path (str): Directory to store entries in.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self, key):
+        """Reads the entry `key`.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            value: The stored value, None if there is no such entry.
+        """
+        try:
+            with open(f"{self.path}/{key}", "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write(self, key, value):
+        """Writes `value` to the entry `key`. The entry is written to a temporary file which then replaces the entry,
+        so concurrent readers see either the old value or the new one, never a partial write.
+
+        Args:
+            key (str): Name of the entry.
+            value: Value to store.
+        """
+        import tempfile
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f".{key}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(tmp_path, f"{self.path}/{key}")
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def written(self, key):
+        """Gets when the entry `key` was last written.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            time (float|None): Unix time of the last write, None if there is no such entry.
+        """
+        try:
+            return os.stat(f"{self.path}/{key}").st_mtime
+        except FileNotFoundError:
+            return None
+
+    def size(self, key):
+        """Gets the size of the entry `key`.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            size (int|None): Size of the stored entry in bytes, None if there is no such entry.
+        """
+        try:
+            return os.stat(f"{self.path}/{key}").st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        """Deletes the entry `key`, if it exists.
+
+        Args:
+            key (str): Name of the entry.
+        """
+        try:
+            os.remove(f"{self.path}/{key}")
+        except FileNotFoundError:
+            pass
+
+    def keys(self):
+        """Gets the name of every entry.
+
+        Returns:
+            keys (list(str)): Names of the stored entries.
+        """
+        return [name for name in os.listdir(self.path) if _is_entry(name)]
+
+    def purge(self):
+        """Deletes every entry."""
+        for key in self.keys():
+            self.delete(key)
+
+
+class SQLiteStore:
+    """Stores cache entries in a single SQLite database, in WAL mode so that readers don't block each other (or the
+    writer). Leaderboards, global boards, puzzles and inputs each have a table keyed (and so indexed) by their year,
+    day, part or id, and everything else goes in a `meta` table keyed by name.
+
+    Each row carries the pickled value, when it was written, and, for records fetched from Advent of Code, the time
+    they were fetched and their validators (etag, last modified, content hash), so the cache can be queried without
+    unpickling anything.
+
+    Args:
+        path (str): Directory to keep the database in.
+    """
+
+    def __init__(self, path):
+        import threading
+
+        self.db_path = os.path.join(path, DB_NAME)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for table, _, _, columns in TABLES:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    + "".join(f"{column} INTEGER NOT NULL, " for column in columns)
+                    + "fetched REAL, etag TEXT, last_modified TEXT, hash TEXT, "
+                    + "written REAL NOT NULL, value BLOB NOT NULL, "
+                    + f"PRIMARY KEY ({', '.join(columns)}))"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_fetched ON {table} (fetched)"
+                )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {META_TABLE} ("
+                "key TEXT PRIMARY KEY, fetched REAL, etag TEXT, last_modified TEXT, hash TEXT, "
+                "written REAL NOT NULL, value BLOB NOT NULL)"
+            )
+
+    def _connect(self):
+        # connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _locate(key):
+        """Gets the table holding `key`, and the condition and parameters selecting its row."""
+        for table, pattern, _, columns in TABLES:
+            match = re.fullmatch(pattern, key)
+            if match:
+                return (
+                    table,
+                    " AND ".join(f"{column} = ?" for column in columns),
+                    tuple(int(group) for group in match.groups()),
+                    columns,
+                )
+        return META_TABLE, "key = ?", (key,), ("key",)
+
+    def read(self, key):
+        """Reads the entry `key`.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            value: The stored value, None if there is no such entry.
+        """
+        table, where, params, _ = self._locate(key)
+        row = (
+            self._connect()
+            .execute(f"SELECT value FROM {table} WHERE {where}", params)
+            .fetchone()
+        )
+        return None if row is None else pickle.loads(row[0])
+
+    def write(self, key, value):
+        """Writes `value` to the entry `key`, in a single transaction.
+
+        Args:
+            key (str): Name of the entry.
+            value: Value to store.
+        """
+        table, _, params, columns = self._locate(key)
+        record = value if isinstance(value, dict) else {}
+        row = params + (
+            record.get("time"),
+            record.get("etag"),
+            record.get("last_modified"),
+            record.get("hash"),
+            time.time(),
+            pickle.dumps(value),
+        )
+        columns = columns + (
+            "fetched",
+            "etag",
+            "last_modified",
+            "hash",
+            "written",
+            "value",
+        )
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                row,
+            )
+
+    def written(self, key):
+        """Gets when the entry `key` was last written.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            time (float|None): Unix time of the last write, None if there is no such entry.
+        """
+        table, where, params, _ = self._locate(key)
+        row = (
+            self._connect()
+            .execute(f"SELECT written FROM {table} WHERE {where}", params)
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def size(self, key):
+        """Gets the size of the entry `key`.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            size (int|None): Size of the stored value in bytes, None if there is no such entry.
+        """
+        table, where, params, _ = self._locate(key)
+        row = (
+            self._connect()
+            .execute(f"SELECT length(value) FROM {table} WHERE {where}", params)
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def delete(self, key):
+        """Deletes the entry `key`, if it exists.
+
+        Args:
+            key (str): Name of the entry.
+        """
+        table, where, params, _ = self._locate(key)
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {table} WHERE {where}", params)
+
+    def keys(self):
+        """Gets the name of every entry.
+
+        Returns:
+            keys (list(str)): Names of the stored entries.
+        """
+        conn = self._connect()
+        keys = []
+        for table, _, key_format, columns in TABLES:
+            keys += [
+                key_format.format(*row)
+                for row in conn.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            ]
+        return keys + [row[0] for row in conn.execute(f"SELECT key FROM {META_TABLE}")]
+
+    def purge(self):
+        """Deletes every entry."""
+        with self._connect() as conn:
+            for table, _, _, _ in TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute(f"DELETE FROM {META_TABLE}")
+
+
+BACKENDS = {"pickle": PickleStore, "sqlite": SQLiteStore}
+
+
+class MemoStore:
+    """Wraps a store, keeping the values read from it in memory for as long as the stored entry is unchanged. Worth
+    it only in a long-running process, where it saves unpickling the same entries over and over.
+
+    Args:
+        store (PickleStore|SQLiteStore): The store to wrap.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._values = {}
+
+    def read(self, key):
+        """Reads the entry `key`, from memory if it hasn't been written since it was last read.
+
+        Args:
+            key (str): Name of the entry.
+
+        Returns:
+            value: The stored value, None if there is no such entry.
+        """
+        written = self.store.written(key)
+        if written is None:
+            self._values.pop(key, None)
+            return None
+        if key in self._values and self._values[key][0] == written:
+            return self._values[key][1]
+        value = self.store.read(key)
+        self._values[key] = (written, value)
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def blob_path(path, digest):
+    """Gets the path of a blob.
+
+    Args:
+        path (str): Directory the store lives in.
+        digest (str): sha256 of the blob, as hex.
+
+    Returns:
+        blob_path (str): Path of the file holding the blob.
+    """
+    return os.path.join(path, BLOB_DIR, digest)
+
+
+def put_blob(path, data):
+    """Stores `data` as a blob, named by its content so that identical bodies are only stored once. Blobs are never
+    modified once written, so they can be read without locking.
+
+    Args:
+        path (str): Directory the store lives in.
+        data (bytes): Body to store.
+
+    Returns:
+        digest (str): sha256 of `data`, as hex, by which the blob can be found.
+    """
+    import hashlib
+    import tempfile
+
+    digest = hashlib.sha256(data).hexdigest()
+    if not os.path.exists(blob_path(path, digest)):
+        os.makedirs(os.path.join(path, BLOB_DIR), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(path, BLOB_DIR), prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path(path, digest))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return digest
+
+
+def migrate(src, dst):
+    """Moves every entry from one store to another. Entries that can't be read (e.g. files that aren't aocstat's, but
+    were left in its data dir) are left where they are.
+
+    Args:
+        src (PickleStore|SQLiteStore): Store to move entries out of.
+        dst (PickleStore|SQLiteStore): Store to move entries into.
+
+    Returns:
+        moved (int): Number of entries moved.
+    """
+    moved = 0
+    for key in src.keys():
+        try:
+            value = src.read(key)
+        except Exception:
+            continue
+        if value is not None:
+            dst.write(key, value)
+        src.delete(key)
+        moved += 1
+    return moved
+
+
+def open_store(backend, path):
+    """Gets the store for `backend` in the directory `path`, opening it on first use. When an SQLite store is first
+    opened, any pickle files left in `path` are migrated into it.
+
+    Args:
+        backend (str): A key of `BACKENDS`.
+        path (str): Directory the store lives in.
+
+    Returns:
+        store (PickleStore|SQLiteStore): The store.
+    """
+    with _stores_lock:
+        if (backend, path) not in _stores:
+            store = BACKENDS[backend](path)
+            if backend != "pickle":
+                migrate(PickleStore(path), store)
+            _stores[(backend, path)] = MemoStore(store) if _memoized else store
+        return _stores[(backend, path)]
+
+
+def memoize():
+    """Makes every store, opened now or later, keep the values read from it in memory (see `MemoStore`)."""
+    global _memoized
+    with _stores_lock:
+        _memoized = True
+        for key, store in _stores.items():
+            if not isinstance(store, MemoStore):
+                _stores[key] = MemoStore(store)
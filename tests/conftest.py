@@ -0,0 +1,20 @@
+import pytest
+
+import aocstat.api as api
+import aocstat.config as config
+import aocstat.context as context
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    # tests make requests to stubs, not Advent of Code
+    monkeypatch.setitem(config.DEFAULTS, "rate_limit", False)
+
+
+@pytest.fixture
+def ctx(monkeypatch, tmp_path):
+    # a fresh context, logged in, with the cache in a temporary directory
+    monkeypatch.setattr(api, "data_dir", str(tmp_path))
+    ctx = context.new()
+    ctx.cookie = "cookie"
+    return ctx
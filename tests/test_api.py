@@ -1,10 +1,16 @@
 import aocstat.api as api
+import aocstat.history as history
 import os
 import datetime as dt
 import bs4
 import pytest
 import pickle
 import appdirs as ad
+import http.server
+import json
+import threading
+import time
+import requests
 
 
 def test_get_most_recent_year():
@@ -48,3 +54,488 @@ def test_purge_cache():
     data_dir = ad.user_data_dir(appname="aocstat", appauthor=False)
     api.purge_cache()
     assert set(os.listdir(data_dir)) == {".gitkeep"} or os.listdir(data_dir) == []
+
+
+def test_get_session():
+    session = api.get_session()
+    assert api.get_session() is session
+    assert session.get_adapter(api.AOC_URL)._pool_maxsize == api.config.get("pool_size")
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content.encode() if isinstance(content, str) else content
+        self.text = self.content.decode()
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession(requests.Session):
+    # answers from `routes`, by method and path: a response, an exception to
+    # raise, or a list of them to go through in turn (staying on the last)
+    def __init__(self, routes, delay=0):
+        super().__init__()
+        self.routes = routes
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        path = url.removeprefix(api.AOC_URL)
+        with self._lock:
+            self.calls.append((method, path, kwargs.get("timeout")))
+            route = self.routes[(method, path)]
+            if isinstance(route, list):
+                route = route.pop(0) if len(route) > 1 else route[0]
+        threading.Event().wait(self.delay)
+        if isinstance(route, BaseException):
+            raise route
+        return route
+
+
+CALENDAR_PAGE = (
+    "<div class='user'>someone</div><a href='/2024/auth/logout'>[Log Out]</a>"
+    + "<pre class='calendar'>"
+    + "<a aria-label='Day 1, one star' href='/2024/day/1' class='calendar-day1 calendar-complete'></a>"
+    + "<a aria-label='Day 2, two stars' href='/2024/day/2' class='calendar-day2 calendar-verycomplete'></a>"
+    + "<a aria-label='Day 3' href='/2024/day/3' class='calendar-day3'></a>"
+    + "</pre>"
+)
+ANSWER_PAGE = "<main><article><p>That's the right answer! You are one gold star closer.</p></article></main>"
+
+
+def test_submit_fetches_calendar_once(monkeypatch, ctx):
+    import aocstat.parse as parse
+
+    session = FakeSession(
+        {
+            ("GET", "/2024"): FakeResponse(CALENDAR_PAGE),
+            ("POST", "/2024/day/1/answer"): FakeResponse(ANSWER_PAGE),
+        }
+    )
+    monkeypatch.setattr(api, "get_session", lambda: session)
+
+    args = parse.parse_pz_submit(["-y", "2024", "-d", "1", "-p", "2", "42"])
+    assert api.submit_answer(args["year"], args["day"], args["answer"])[0]
+    assert ctx.requests == {"GET /2024": 1, "POST /2024/day/1/answer": 1}
+    assert api.get_current_part(2024, 1) is None
+
+
+def test_get_stars(monkeypatch, ctx):
+    session = FakeSession({("GET", "/2024"): FakeResponse(CALENDAR_PAGE)})
+    monkeypatch.setattr(api, "get_session", lambda: session)
+
+    assert api.get_stars(2024) == 0b1101
+    assert [api.get_current_part(2024, day) for day in (1, 2, 3)] == [2, None, 1]
+    assert api.get_earliest_uncompleted_day(2024) == 1
+
+
+def test_bad_pages_arent_cached(monkeypatch, ctx):
+    monkeypatch.setattr(api.time, "sleep", lambda seconds: None)
+    logins = []
+    monkeypatch.setattr(
+        api,
+        "get_cookie",
+        lambda cache_invalid=False: logins.append(cache_invalid) or "cookie",
+    )
+    logged_out = FakeResponse("<pre class='calendar'></pre><a href='/2024/auth/login'>")
+    session = FakeSession(
+        {
+            ("GET", "/2023"): FakeResponse("<html>oops</html>", status_code=502),
+            ("GET", "/2024/leaderboard/private"): FakeResponse("", status_code=404),
+            ("GET", "/2024"): [logged_out, FakeResponse(CALENDAR_PAGE)],
+        }
+    )
+    monkeypatch.setattr(api, "get_session", lambda: session)
+
+    # errors are raised, rather than cached as no stars or no boards
+    with pytest.raises(api.OfflineError):
+        api.get_stars(2023)
+    monkeypatch.setattr(api, "get_most_recent_year", lambda: 2024)
+    with pytest.raises(api.OfflineError):
+        api.get_lb_ids()
+    assert api._read_cache("stars_2023") is None
+    assert api._read_cache("lb_ids") is None
+    # and an expired session is logged in again
+    assert api.get_stars(2024) == 0b1101
+    assert logins.count(True) == 1
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    etag = '"v1"'
+    body = json.dumps({"event": "2024", "members": {}}).encode()
+    responses = []
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header("ETag", self.etag)
+            self.send_header("Content-Length", str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body)
+        self.responses.append((self.path, self.headers.get("If-None-Match")))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(api, "AOC_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(api, "_session", None)
+    StubHandler.responses = []
+    yield StubHandler
+    server.shutdown()
+
+
+def test_get_priv_lb_revalidates(monkeypatch, tmp_path, ctx, stub_server):
+    monkeypatch.setattr(api, "_priv_lbs", {})
+
+    lb, cached = api.get_priv_lb(1, 2024)
+    assert cached is False
+    with open(tmp_path / "lb_2024_1", "rb") as f:
+        record = pickle.load(f)
+    assert record["etag"] == stub_server.etag
+    # expire the entry so that the next call revalidates it
+    record["time"] = 0
+    with open(tmp_path / "lb_2024_1", "wb") as f:
+        pickle.dump(record, f)
+
+    revalidated, cached = api.get_priv_lb(1, 2024)
+    # unchanged, so not parsed again
+    assert revalidated is lb and cached is False
+    assert (
+        "/2024/leaderboard/private/view/1.json",
+        stub_server.etag,
+    ) in stub_server.responses
+    with open(tmp_path / "lb_2024_1", "rb") as f:
+        assert pickle.load(f)["time"] > 0
+    # the revalidated copy is unchanged, so is only in history once
+    assert history.snapshot(str(tmp_path), 2024, 1)[0] == lb
+    with open(tmp_path / "history" / "2024_1.log") as f:
+        assert len(f.readlines()) == 1
+
+    # boards cached before their history was kept get a checkpoint on revalidation
+    for name in os.listdir(tmp_path / "history"):
+        os.remove(tmp_path / "history" / name)
+    with open(tmp_path / "lb_2024_1", "rb") as f:
+        record = pickle.load(f)
+    record["time"] = 0
+    with open(tmp_path / "lb_2024_1", "wb") as f:
+        pickle.dump(record, f)
+    api.get_priv_lb(1, 2024)
+    assert history.snapshot(str(tmp_path), 2024, 1)[0] == lb
+
+
+def test_offline_serves_stale(monkeypatch, tmp_path, ctx):
+    offline = requests.exceptions.ConnectionError("no route to host")
+    session = FakeSession(
+        {("GET", f"/2024/leaderboard/private/view/{id}.json"): offline for id in (1, 2)}
+    )
+    monkeypatch.setattr(api, "get_session", lambda: session)
+    monkeypatch.setattr(api.time, "sleep", lambda seconds: None)
+    with open(tmp_path / "lb_2024_1", "wb") as f:
+        pickle.dump({"time": 0, "content": b'{"members": {}}'}, f)
+
+    assert api.get_priv_lb(1, 2024) == ({"members": {}}, 0)
+    assert not api.connected()
+    # the negative cache means the next stale read doesn't try the network at all
+    assert api.get_priv_lb(1, 2024) == ({"members": {}}, 0)
+    assert sum(ctx.requests.values()) == 1
+    with pytest.raises(api.OfflineError):
+        api.get_priv_lb(2, 2024)
+
+
+def _flaky(failures):
+    return [requests.exceptions.ReadTimeout("timed out")] * failures + [
+        FakeResponse(ANSWER_PAGE)
+    ]
+
+
+def test_request_retries(monkeypatch, ctx):
+    monkeypatch.setattr(api.time, "sleep", lambda seconds: None)
+
+    session = FakeSession({("GET", "/2024"): _flaky(api.config.get("retries"))})
+    monkeypatch.setattr(api, "get_session", lambda: session)
+    assert api._request("GET", "/2024").status_code == 200
+    assert len(session.calls) == api.config.get("retries") + 1
+    assert session.calls[0][2] == (
+        api.config.get("connect_timeout"),
+        api.config.get("read_timeout"),
+    )
+    assert [attempt[3] for attempt in ctx.attempts][-1] == 200
+
+    # answers are never resubmitted
+    session = FakeSession({("POST", "/2024/day/1/answer"): _flaky(1)})
+    monkeypatch.setattr(api, "get_session", lambda: session)
+    with pytest.raises(api.OfflineError):
+        api._request("POST", "/2024/day/1/answer")
+    assert len(session.calls) == 1
+
+
+def test_merge_priv_lbs():
+    def member(id, *star_ts):
+        return {
+            "id": id,
+            "name": f"member {id}",
+            "local_score": 0,
+            "completion_day_level": {
+                "1": {str(i + 1): {"get_star_ts": ts} for i, ts in enumerate(star_ts)}
+            },
+        }
+
+    a = {"event": "2024", "members": {"1": member(1, 10, 20), "2": member(2, 5)}}
+    b = {"event": "2024", "members": {"1": member(1, 10, 20), "3": member(3, 1, 2)}}
+    merged = api.merge_priv_lbs([a, b])
+    assert set(merged["members"]) == {"1", "2", "3"}
+    # part 1: 3 (3 points), 2 (2 points), 1 (1 point); part 2: 3 (3 points), 1 (2 points)
+    assert {id: m["local_score"] for id, m in merged["members"].items()} == {
+        "1": 3,
+        "2": 2,
+        "3": 6,
+    }
+
+
+PUZZLE_PAGE = (
+    "<main><article class='day-desc'><h2>--- Day 1: Test ---</h2><p>Text</p></article>"
+    + "<article class='day-desc'><h2>--- Part Two ---</h2><p>More</p></article></main>"
+)
+
+
+def test_prefetch(monkeypatch, tmp_path, ctx):
+    routes = {("GET", "/2024"): FakeResponse(CALENDAR_PAGE)}
+    for day in range(1, 26):
+        routes[("GET", f"/2024/day/{day}")] = FakeResponse(PUZZLE_PAGE)
+        routes[("GET", f"/2024/day/{day}/input")] = FakeResponse(
+            f"input for /2024/day/{day}/input\n"
+        )
+    session = FakeSession(routes)
+    monkeypatch.setattr(api, "get_session", lambda: session)
+
+    assert len(list(api.prefetch([2024]))) == 25
+    assert api.get_input(2024, 25) == "input for /2024/day/25/input\n"
+    assert os.path.exists(tmp_path / "pz_2024_2_2")
+    assert not os.path.exists(tmp_path / "pz_2024_3_2")
+    # everything is cached now, so there's nothing left to do
+    assert list(api.prefetch([2024])) == []
+
+
+def test_rate_limit_serves_stale(monkeypatch, tmp_path, ctx):
+    import aocstat.ratelimit as ratelimit
+
+    monkeypatch.setitem(api.config.DEFAULTS, "rate_limit", True)
+    with open(tmp_path / "lb_2024_1", "wb") as f:
+        pickle.dump({"time": 0, "content": b'{"members": {}}'}, f)
+
+    capacity = ratelimit.BUCKETS["priv_lb"][0]
+    for _ in range(capacity):
+        assert ratelimit.acquire("priv_lb_1") == 0
+    assert ratelimit.status()["priv_lb_1"][2] > 0
+    with pytest.raises(ratelimit.RateLimitedError):
+        ratelimit.acquire("priv_lb_1", block=False)
+    # the next token is minutes away, which is too long to wait for
+    with pytest.raises(ratelimit.RateLimitedError):
+        ratelimit.acquire("priv_lb_1")
+    # every board has a budget of its own
+    assert (
+        ratelimit.acquire(
+            ratelimit.bucket("GET", "/2024/leaderboard/private/view/2.json")
+        )
+        == 0
+    )
+    # with the budget spent, stale data is served instead of making a request
+    assert api.get_priv_lb(1, 2024) == ({"members": {}}, 0)
+    assert sum(ctx.requests.values()) == 1
+    assert ctx.attempts == []
+    # even when forcing an update, and the refusal is recorded for the user
+    assert api.get_priv_lb(1, 2024, force_update=True) == ({"members": {}}, 0)
+    assert [e.bucket for e in ctx.rate_limited] == ["priv_lb_1"] * 2
+
+
+def test_rate_limit_per_fetch(monkeypatch, ctx):
+    monkeypatch.setitem(api.config.DEFAULTS, "rate_limit", True)
+    monkeypatch.setattr(api.time, "sleep", lambda seconds: None)
+    path = "/2024/leaderboard/private/view/1.json"
+    session = FakeSession({("GET", path): _flaky(api.config.get("retries"))})
+    monkeypatch.setattr(api, "get_session", lambda: session)
+
+    # retries don't take tokens of their own
+    assert api._request("GET", path).status_code == 200
+    assert len(session.calls) == api.config.get("retries") + 1
+
+    # nor does fetching again after logging in again
+    monkeypatch.setattr(api, "get_cookie", lambda cache_invalid=False: "cookie")
+    path = "/2024/leaderboard/private/view/2.json"
+    session.routes[("GET", path)] = [
+        FakeResponse("<html>log in</html>"),
+        FakeResponse('{"members": {}}'),
+    ]
+    assert api.get_priv_lb(2, 2024) == ({"members": {}}, False)
+    assert ctx.rate_limited == []
+
+
+def _slow_board():
+    return FakeSession(
+        {
+            ("GET", "/2024/leaderboard/private/view/1.json"): FakeResponse(
+                '{"members": {}}'
+            )
+        },
+        delay=0.1,
+    )
+
+
+def test_single_flight(monkeypatch, tmp_path, ctx):
+    session = _slow_board()
+    monkeypatch.setattr(api, "get_session", lambda: session)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(api.get_priv_lb(1, 2024)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # one thread fetched, the rest waited and were handed its result
+    assert len(session.calls) == 1
+    assert [lb for lb, _ in results] == [{"members": {}}] * 10
+    assert [f for f in os.listdir(tmp_path) if f.startswith(".")] == []
+
+
+def test_input_blobs(tmp_path, ctx, capfd):
+    import aocstat.main as main
+
+    # an input cached before inputs were kept as blobs
+    with open(tmp_path / "in_2024_1", "wb") as f:
+        pickle.dump("1 2\n3 4\n", f)
+    api._write_cache(
+        "in_2024_2",
+        {"time": 0, "blob": api.store.put_blob(str(tmp_path), b"1 2\n3 4\n")},
+    )
+
+    assert api.get_input(2024, 1) == "1 2\n3 4\n"
+    # identical inputs are only stored once
+    assert api.get_input_path(2024, 1) == api.get_input_path(2024, 2)
+    assert len(os.listdir(tmp_path / "blobs")) == 1
+
+    main._write_file(api.get_input_path(2024, 1))
+    assert capfd.readouterr().out == "1 2\n3 4\n"
+
+
+def test_cache_prune(tmp_path, ctx):
+    import aocstat.cache as cache
+
+    api._write_cache("cookie", "cookie")
+    api._write_cache("pz_2024_1_1", {"title": "Title", "text": []})
+    for id in range(3):
+        api._write_cache(f"lb_2024_{id}", {"time": 0, "content": b"x" * 1000})
+    api._read_cache("lb_2024_0")
+    api._read_cache("lb_2024_9")
+    cache.record_usage()
+    assert ctx.cache_hits["lb_2024_0"] == 1
+    assert os.path.exists(tmp_path / cache.USAGE_LOG)
+
+    stats = cache.stats()
+    assert stats["leaderboards"]["entries"] == 3
+    assert stats["leaderboards"]["hits"] == 1
+    assert stats["leaderboards"]["misses"] == 1
+    assert stats["leaderboards"]["reclaimable"] == stats["leaderboards"]["bytes"]
+    assert stats["auth"]["reclaimable"] == 0
+
+    # the leaderboard that was read most recently is kept
+    evicted, freed = cache.prune(sum(s["bytes"] for s in stats.values()) - 1)
+    assert evicted in [["lb_2024_1"], ["lb_2024_2"]]
+    assert cache.prune(0)[0][-1] == "lb_2024_0"
+    assert api._read_cache("cookie") == "cookie"
+    assert api._read_cache("pz_2024_1_1") is not None
+
+
+def test_usage_log_is_bounded(monkeypatch, tmp_path, ctx):
+    import aocstat.cache as cache
+
+    monkeypatch.setattr(cache, "USAGE_LOG_MAX", 1000)
+    api._write_cache("lb_2024_1", {"time": 0, "content": b"{}"})
+    # commands that only read never prune, which would otherwise fold the log
+    for _ in range(100):
+        ctx.cache_hits.clear()
+        api._read_cache("lb_2024_1")
+        cache.record_usage()
+    assert os.path.getsize(tmp_path / cache.USAGE_LOG) <= 1000
+    assert cache.stats()["leaderboards"]["hits"] == 100
+
+
+def test_stale_while_revalidate(monkeypatch, ctx):
+    import aocstat.refresh as refresh
+
+    session = _slow_board()
+    refreshes = []
+    monkeypatch.setattr(api, "get_session", lambda: session)
+    monkeypatch.setattr(
+        api, "_refresh_in_background", lambda *args: refreshes.append(args)
+    )
+    monkeypatch.setitem(api.config.DEFAULTS, "stale_while_revalidate", True)
+    # the background refresh reads the cookie from the cache
+    api._write_cache("cookie", "cookie")
+    api._write_cache("lb_2024_1", {"time": 0, "content": b'{"members": {"1": {}}}'})
+
+    # the stale board is served straight away, and refreshed in the background
+    assert api.get_priv_lb(1, 2024) == ({"members": {"1": {}}}, 0)
+    assert list(api.get_priv_lbs([1], 2024)) == [(1, {"members": {"1": {}}}, 0)]
+    assert refreshes == [("priv_lb", 2024, 1)] * 2
+    assert len(session.calls) == 0
+
+    spawned = time.time()
+    refresh.refresh(["priv_lb", str(spawned), "2024", "1"])
+    assert len(session.calls) == 1
+    lb, cached = api.get_priv_lb(1, 2024)
+    assert lb == {"members": {}} and cached > 0
+
+    # refreshes queued behind it find the board fresh, or written since they were spawned
+    refresh.refresh(["priv_lb", str(spawned), "2024", "1"])
+    api._write_cache("lb_2024_1", {"time": 0, "content": b'{"members": {}}'})
+    refresh.refresh(["priv_lb", str(spawned), "2024", "1"])
+    assert len(session.calls) == 1
+
+    # an expired session isn't logged in again from the background
+    session.routes[("GET", "/2024/leaderboard/private/view/1.json")] = FakeResponse(
+        "<html>log in</html>"
+    )
+    refresh.refresh(["priv_lb", str(time.time()), "2024", "1"])
+    assert len(session.calls) == 2
+    assert api._read_cache("lb_2024_1") == {"time": 0, "content": b'{"members": {}}'}
+
+
+def test_refresh_in_background_once(monkeypatch):
+    import subprocess
+
+    class Process:
+        def __init__(self, args, **kwargs):
+            self.args = args
+            self.returncode = None
+            started.append(self)
+
+        def poll(self):
+            return self.returncode
+
+    started = []
+    monkeypatch.setattr(subprocess, "Popen", Process)
+    monkeypatch.setattr(api, "_refreshes", {})
+    api._refresh_in_background("priv_lb", 2024, 1)
+    api._refresh_in_background("priv_lb", 2024, 1)
+    api._refresh_in_background("priv_lb", 2024, 2)
+    assert len(started) == 2
+    assert started[0].args[2:4] == ["aocstat.refresh", "priv_lb"]
+    assert started[0].args[-2:] == ["2024", "1"]
+
+    # once it exits, the next stale read starts another
+    started[0].returncode = 0
+    api._refresh_in_background("priv_lb", 2024, 1)
+    assert len(started) == 3
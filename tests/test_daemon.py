@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import aocstat.api as api
+import aocstat.daemon as daemon
+from tests.test_startup import _seed_cache
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no Unix domain sockets")
+def test_daemon(monkeypatch, tmp_path, capfd):
+    data_dir = tmp_path / "data" / "aocstat"
+    _seed_cache(data_dir)
+    os.makedirs(tmp_path / "config" / "aocstat")
+    env = dict(
+        os.environ,
+        XDG_DATA_HOME=str(tmp_path / "data"),
+        XDG_CONFIG_HOME=str(tmp_path / "config"),
+    )
+    monkeypatch.setattr(api, "data_dir", str(data_dir))
+    # AF_UNIX paths are limited to ~100 characters
+    if len(daemon.socket_path()) > 100:
+        pytest.skip("socket path too long")
+
+    proc = subprocess.Popen(
+        [sys.executable, "-c", "import aocstat.main; aocstat.main.start(['daemon'])"],
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert proc.stdout.readline().startswith("Listening on")
+        # only read-only commands are forwarded
+        assert daemon.forward(["config", "list"]) is None
+        assert daemon.forward(["pz", "input"]) == 0
+        assert capfd.readouterr().out == "input\n"
+        assert daemon.forward(["pz", "input", "--bogus"]) == 2
+        assert "unrecognized arguments" in capfd.readouterr().err
+        # output that may need paging is sent back to be shown here
+        assert daemon.forward(["lb", "priv"]) == 0
+        assert "someone" in capfd.readouterr().out
+        # anything that isn't cached is left to be fetched here
+        assert daemon.forward(["pz", "input", "-d", "2"]) is None
+        assert capfd.readouterr().out == ""
+        assert daemon.stop()
+        proc.wait(timeout=10)
+    finally:
+        proc.kill()
+    assert not os.path.exists(daemon.socket_path())
+    assert daemon.forward(["pz", "input"]) is None
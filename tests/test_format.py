@@ -5,3 +5,43 @@ def test_wrap_text():
     text = "a" * 100
     output = format.wrap_text(text, 10)
     assert all([len(line) <= 10 for line in output.split("\n")])
+
+
+def test_format_progress():
+    output = format.format_progress({2015: (1 << 50) - 1, 2016: 0b1101}, False)
+    rows = output.strip("\n").split("\n")[2:]
+    assert rows[0].startswith("2015  * * * ") and rows[0].endswith("50/50")
+    assert rows[1].startswith("2016  - * . ") and rows[1].endswith("3/50")
+
+
+def test_format_lb_summary():
+    lb = {
+        "members": {
+            "1": {"id": 1, "name": "someone", "local_score": 3},
+            "2": {"id": 2, "name": None, "local_score": 7},
+        }
+    }
+    assert format.format_lb_summary(lb) == "2 members, top: anonymous user #2 (7)"
+
+
+def test_format_priv_lb_changes():
+    changes = {
+        "since": 0,
+        "until": 0,
+        "stars": [(0, "someone", 1, 2)],
+        "members": [{"name": "someone", "score": (5, 12), "rank": (3, 1)}],
+        "joined": [],
+        "left": [],
+    }
+    rows = format.format_priv_lb_changes(changes, False).split("\n")
+    assert rows[2].endswith("* day  1 part 2  someone")
+    assert rows[4] == "  1) 12 (+7) ^2  someone"
+    # scores that fell aren't shown as gains
+    changes["members"].append({"name": "other", "score": (9, 4), "rank": (1, 2)})
+    res = format.format_priv_lb_changes(changes, True)
+    assert format.ANSI_COLOURS["green"] + "(+7)" in res
+    assert format.ANSI_COLOURS["red"] + "(-5)" in res
+    changes.update(stars=[], members=[])
+    assert format.format_priv_lb_changes(changes, False).endswith(
+        "Nothing has changed.\n"
+    )
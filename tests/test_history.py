@@ -0,0 +1,132 @@
+import copy
+import json
+import random
+
+import aocstat.history as history
+
+
+def _member(id):
+    return {
+        "id": id,
+        "name": f"user {id}",
+        "local_score": 0,
+        "stars": 0,
+        "last_star_ts": 0,
+        "completion_day_level": {},
+    }
+
+
+def test_history(tmp_path):
+    random.seed(0)
+    lb = {"event": "2024", "owner_id": 1, "members": {"1": _member(1)}}
+    copies = []
+    full = 0
+    for step in range(300):
+        t = 1733029200 + step * 900
+        if step == 100:
+            lb["members"]["2"] = _member(2)
+        if step == 200:
+            del lb["members"]["1"]
+        for member in lb["members"].values():
+            days = member["completion_day_level"]
+            if random.random() < 0.2 and member["stars"] < 50:
+                day = str(member["stars"] // 2 + 1)
+                days.setdefault(day, {})[str(len(days.get(day, {})) + 1)] = {
+                    "get_star_ts": t,
+                    "star_index": step,
+                }
+                member["stars"] += 1
+                member["local_score"] += random.randint(1, 2)
+                member["last_star_ts"] = t
+        full += len(json.dumps(lb))
+        history.record(str(tmp_path), 2024, 1, copy.deepcopy(lb), t)
+        copies.append((t, copy.deepcopy(lb)))
+
+    # unchanged and out of order copies aren't recorded
+    assert not history.record(str(tmp_path), 2024, 1, lb, t + 900)
+    assert not history.record(str(tmp_path), 2024, 1, {"members": {}}, 0)
+    log = tmp_path / "history" / "2024_1.log"
+    assert log.stat().st_size < full / 10
+    assert sum(1 for line in log.open() if '"checkpoint"' in line) > 1
+
+    # copies that didn't change anything leave the time of the one before them
+    assert history.snapshot(str(tmp_path), 2024, 1)[0] == lb
+    assert history.snapshot(str(tmp_path), 2024, 1, 0) == (None, None)
+    for t, expected in copies[::7]:
+        board, fetched = history.snapshot(str(tmp_path), 2024, 1, t + 1)
+        assert board == expected and fetched <= t
+
+    since, expected = copies[50]
+    base, fetched, changes = history.deltas(str(tmp_path), 2024, 1, since)
+    assert base == expected and fetched <= since
+    assert [t for t, _ in changes] == sorted(t for t, _ in changes)
+    assert all(t > since for t, _ in changes)
+    for _, delta in changes:
+        history.apply(base, delta)
+    assert base == lb
+
+
+def test_diff_derived_fields():
+    old = {"members": {"1": _member(1)}}
+    new = copy.deepcopy(old)
+    member = new["members"]["1"]
+    member["completion_day_level"] = {"1": {"1": {"get_star_ts": 100}}}
+    member.update(stars=1, last_star_ts=100, local_score=5)
+    # the star count and last star time follow from the stars
+    delta = history.diff(old, new)
+    assert delta["members"]["1"].keys() == {"local_score", "completion_day_level"}
+    assert history.apply(copy.deepcopy(old), delta) == new
+
+    # unless they don't add up
+    member["stars"] = 2
+    delta = history.diff(old, new)
+    assert delta["members"]["1"]["stars"] == 2
+    assert history.apply(copy.deepcopy(old), delta) == new
+
+
+def test_changes(tmp_path):
+    def member(id, score, stars):
+        return {
+            "id": id,
+            "name": f"user {id}",
+            "local_score": score,
+            "stars": len(stars),
+            "completion_day_level": {
+                str(day): {str(part): {"get_star_ts": ts} for part, ts in parts}
+                for day, parts in stars.items()
+            },
+        }
+
+    path = str(tmp_path)
+    lb = {
+        "event": "2024",
+        "members": {
+            "1": member(1, 10, {1: [(1, 100)]}),
+            "2": member(2, 5, {}),
+            "3": member(3, 7, {}),
+        },
+    }
+    history.record(path, 2024, 1, lb, 1000)
+    assert history.changes(path, 2024, 1, 1000)["stars"] == []
+
+    lb = copy.deepcopy(lb)
+    lb["members"]["2"] = member(2, 12, {1: [(1, 1100), (2, 1150)]})
+    history.record(path, 2024, 1, lb, 1200)
+    lb = copy.deepcopy(lb)
+    lb["members"]["4"] = member(4, 1, {})
+    del lb["members"]["3"]
+    history.record(path, 2024, 1, lb, 1300)
+
+    changes = history.changes(path, 2024, 1, 1000)
+    assert (changes["since"], changes["until"]) == (1000, 1300)
+    assert changes["stars"] == [(1100, "user 2", 1, 1), (1150, "user 2", 1, 2)]
+    assert changes["members"] == [
+        {"name": "user 2", "score": (5, 12), "rank": (3, 1)},
+        # pushed down a place without scoring
+        {"name": "user 1", "score": (10, 10), "rank": (1, 2)},
+        {"name": "user 4", "score": (None, 1), "rank": (None, 3)},
+    ]
+    assert (changes["joined"], changes["left"]) == (["user 4"], ["user 3"])
+    # only what changed after `since` is listed
+    assert history.changes(path, 2024, 1, 1200)["stars"] == []
+    assert history.changes(path, 2024, 2, 0) is None
@@ -0,0 +1,84 @@
+import copy
+import http.client
+import threading
+from http.server import ThreadingHTTPServer
+
+import aocstat.api as api
+import aocstat.metrics as metrics
+
+LB = {
+    "event": "2024",
+    "members": {
+        "1": {
+            "id": 1,
+            "name": 'some "one"',
+            "local_score": 3,
+            "stars": 1,
+            "completion_day_level": {"1": {"1": {"get_star_ts": 1733029200}}},
+        },
+        "2": {
+            "id": 2,
+            "name": None,
+            "local_score": 2,
+            "stars": 0,
+            "completion_day_level": {},
+        },
+    },
+}
+
+
+def test_metrics(monkeypatch):
+    boards = [copy.deepcopy(LB)]
+    fetches = []
+
+    def get_priv_lb(id, yr):
+        fetches.append((id, yr))
+        return boards[-1], 1733030000 + len(fetches)
+
+    monkeypatch.setattr(api, "get_priv_lb", get_priv_lb)
+    board = metrics.Board(1, 2024)
+    exposition = metrics.Exposition([board])
+    exposition.refresh()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), metrics._handler(exposition))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def scrape(path="/metrics"):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        conn.request("GET", path)
+        res = conn.getresponse()
+        return res.status, res.read().decode()
+
+    try:
+        status, body = scrape()
+        assert status == 200
+        labels = 'board="1",year="2024",member="1",name="some \\"one\\""'
+        assert f"aocstat_member_stars{{{labels}}} 1\n" in body
+        assert f"aocstat_member_local_score{{{labels}}} 3\n" in body
+        assert (
+            f"aocstat_member_last_star_timestamp_seconds{{{labels}}} 1733029200\n"
+            in body
+        )
+        assert f"aocstat_member_rank{{{labels}}} 1\n" in body
+        assert 'name="anonymous user #2"} 2\n' in body
+        assert body.count("# TYPE aocstat_member_stars gauge") == 1
+        assert 'aocstat_board_cache_age_seconds{board="1",year="2024"}' in body
+        # scrapes are answered from memory
+        scrape()
+        assert len(fetches) == 1
+        assert scrape("/other")[0] == 404
+
+        # only members that changed (or moved) are rendered again
+        boards.append(copy.deepcopy(LB))
+        boards[-1]["members"]["2"]["local_score"] = 5
+        boards[-1]["members"]["2"]["stars"] = 2
+        assert board.update(boards[-1], 1733040000) == 2
+        assert board.update(boards[-1], 1733040001) == 0
+        boards.append(copy.deepcopy(boards[-1]))
+        del boards[-1]["members"]["1"]
+        assert board.update(boards[-1], 1733040002) == 1
+        assert 'member="1"' not in "".join(
+            board.samples["aocstat_member_rank"].values()
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,71 @@
+import pytest
+
+import aocstat.api as api
+import aocstat.context as context
+import aocstat.parse as parse
+
+
+def _offline(*args, **kwargs):
+    raise AssertionError("help and usage errors shouldn't touch the network")
+
+
+@pytest.mark.parametrize(
+    "parse_fn, args",
+    [
+        (parse.parse_priv_lb, ["-h"]),
+        (parse.parse_priv_lb, ["--id", "abc"]),
+        (parse.parse_priv_lb, ["--since", "yesterday"]),
+        (parse.parse_glob_lb, ["-d", "26"]),
+        (parse.parse_pz_view, ["-h"]),
+        (parse.parse_pz_submit, []),
+    ],
+)
+def test_syntax_errors_are_offline(monkeypatch, parse_fn, args):
+    monkeypatch.setattr(api, "_request", _offline)
+    monkeypatch.setattr(api, "get_cookie", _offline)
+    context.new()
+    with pytest.raises(SystemExit):
+        parse_fn(args)
+
+
+def test_resolve_priv_lb(monkeypatch):
+    monkeypatch.setattr(api, "get_lb_ids", lambda: [1, 2])
+    monkeypatch.setattr(api, "get_default_lb_id", lambda: 2)
+    assert parse.parse_priv_lb([])["id"] == 2
+    assert parse.parse_priv_lb(["--id", "1"])["id"] == 1
+    with pytest.raises(SystemExit):
+        parse.parse_priv_lb(["--id", "3"])
+
+
+@pytest.mark.parametrize("parse_fn", [parse.parse_serve, parse.parse_metrics])
+def test_resolve_priv_lbs(monkeypatch, parse_fn):
+    monkeypatch.setattr(api, "get_lb_ids", lambda: [1, 2])
+    monkeypatch.setattr(api, "get_default_lb_id", lambda: 2)
+    assert parse_fn([])["id"] == [2]
+    assert parse_fn(["--id", "1", "--id", "2"])["id"] == [1, 2]
+    with pytest.raises(SystemExit):
+        parse_fn(["--id", "3"])
+    monkeypatch.setattr(api, "get_lb_ids", lambda: [])
+    with pytest.raises(SystemExit):
+        parse_fn([])
+
+
+def test_priv_lb_since(monkeypatch):
+    monkeypatch.setattr(api, "get_lb_ids", lambda: [1])
+    monkeypatch.setattr(api, "get_default_lb_id", lambda: 1)
+    assert parse.parse_priv_lb([])["since"] is None
+    assert parse.parse_priv_lb(["--since", "last"])["since"] == "last"
+    assert parse.parse_priv_lb(["--since", "1733029200"])["since"] == 1733029200
+    assert (
+        parse.parse_priv_lb(["--since", "2024-12-01T05:00+00:00"])["since"]
+        == 1733029200
+    )
+
+
+def test_glob_lb_is_offline(monkeypatch, tmp_path):
+    monkeypatch.setattr(api, "data_dir", str(tmp_path))
+    monkeypatch.setattr(api, "_request", _offline)
+    monkeypatch.setattr(api, "get_cookie", _offline)
+    context.new()
+    output = parse.parse_glob_lb(["-y", "2020", "-d", "1", "-p", "1"])
+    assert (output["year"], output["day"], output["part"]) == (2020, 1, 1)
@@ -0,0 +1,34 @@
+import datetime as dt
+
+import aocstat.config as config
+import aocstat.policy as policy
+
+
+def _at(monkeypatch, *args):
+    monkeypatch.setattr(policy, "_now", lambda: dt.datetime(*args, tzinfo=policy._EST))
+
+
+def _glob_lb(size):
+    return {
+        part: {"members": {id: {} for id in range(size)}, "day": 1}
+        for part in ["1", "2"]
+    }
+
+
+def test_priv_lb_ttl(monkeypatch):
+    _at(monkeypatch, 2024, 12, 10)
+    assert policy.priv_lb_ttl(2024) == config.get("ttl")
+    assert policy.priv_lb_ttl(2023) == config.get("archive_ttl")
+    assert policy.stars_ttl(2023) == policy.IMMUTABLE
+    _at(monkeypatch, 2025, 3, 1)
+    assert policy.priv_lb_ttl(2024) == config.get("archive_ttl")
+    assert policy.lb_ids_ttl(2024) == config.get("archive_ttl")
+
+
+def test_glob_lb_ttl(monkeypatch):
+    _at(monkeypatch, 2024, 12, 10, 0, 20)
+    assert policy.glob_lb_ttl(2024, 10, _glob_lb(30)) == config.get("release_ttl")
+    assert policy.glob_lb_ttl(2024, 10, _glob_lb(100)) == policy.IMMUTABLE
+    assert policy.glob_lb_ttl(2024, 9, _glob_lb(30)) == config.get("ttl")
+    assert policy.glob_lb_ttl(2024, None, _glob_lb(30)["1"]) == config.get("ttl")
+    assert policy.glob_lb_ttl(2023, None, _glob_lb(30)["1"]) == policy.IMMUTABLE
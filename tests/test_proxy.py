@@ -0,0 +1,153 @@
+import http.server
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import aocstat.api as api
+import aocstat.context as context
+import aocstat.proxy as proxy
+import aocstat.ratelimit as ratelimit
+
+
+class UpstreamHandler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        UpstreamHandler.requests.append((self.path, self.headers.get("Cookie")))
+        threading.Event().wait(0.1)
+        body = f'{{"path": "{self.path}", "cookie": "{self.headers.get("Cookie")}"}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def do_POST(self):
+        UpstreamHandler.requests.append((self.path, self.headers.get("Cookie")))
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(handler):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def team_proxy():
+    UpstreamHandler.requests = []
+    upstream = _serve(UpstreamHandler)
+    server = _serve(
+        proxy._handler(proxy.Proxy(f"http://127.0.0.1:{upstream.server_port}"))
+    )
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    upstream.shutdown()
+
+
+def test_proxy(team_proxy):
+    def get(path, cookie):
+        return requests.get(f"{team_proxy}{path}", cookies={"session": cookie}).json()
+
+    # identical requests in flight are made upstream once
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        bodies = list(pool.map(lambda _: get("/2024/day/1/input", "a"), range(10)))
+    assert bodies == [{"path": "/2024/day/1/input", "cookie": "session=a"}] * 10
+    # and then come from cache, per cookie
+    assert get("/2024/day/1/input", "a")["cookie"] == "session=a"
+    assert get("/2024/day/1/input", "b")["cookie"] == "session=b"
+    # global boards are the same for everyone, so are fetched without a cookie
+    assert get("/2024/leaderboard/day/1", "a") == get("/2024/leaderboard/day/1", "b")
+    assert UpstreamHandler.requests == [
+        ("/2024/day/1/input", "session=a"),
+        ("/2024/day/1/input", "session=b"),
+        ("/2024/leaderboard/day/1", None),
+    ]
+
+    # a submission drops the submitter's cached page for the day
+    get("/2024/day/1", "a")
+    requests.post(
+        f"{team_proxy}/2024/day/1/answer",
+        data={"level": 1, "answer": 1},
+        cookies={"session": "a"},
+    )
+    get("/2024/day/1", "a")
+    assert UpstreamHandler.requests[3:] == [
+        ("/2024/day/1", "session=a"),
+        ("/2024/day/1/answer", "session=a"),
+        ("/2024/day/1", "session=a"),
+    ]
+
+
+def test_api_through_proxy(monkeypatch, tmp_path, team_proxy):
+    monkeypatch.setattr(api, "data_dir", str(tmp_path))
+    monkeypatch.setattr(api, "_session", None)
+    monkeypatch.setitem(api.config.DEFAULTS, "proxy_url", team_proxy)
+    context.new().cookie = "cookie"
+
+    assert (
+        api.get_input(2024, 1)
+        == '{"path": "/2024/day/1/input", "cookie": "session=cookie"}'
+    )
+    assert UpstreamHandler.requests == [("/2024/day/1/input", "session=cookie")]
+
+
+def test_proxy_rate_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(api, "data_dir", str(tmp_path))
+    monkeypatch.setattr(api, "_session", None)
+    monkeypatch.setitem(api.config.DEFAULTS, "rate_limit", True)
+    context.new().cookie = "c"
+    UpstreamHandler.requests = []
+    upstream = _serve(UpstreamHandler)
+    team = proxy.Proxy(f"http://127.0.0.1:{upstream.server_port}")
+    server = _serve(proxy._handler(team))
+    monkeypatch.setitem(
+        api.config.DEFAULTS, "proxy_url", f"http://127.0.0.1:{server.server_port}"
+    )
+    board = "/2024/leaderboard/private/view/1.json"
+
+    # everyone on the team has a budget of their own, as they would without the proxy
+    members = [str(i) for i in range(12)]
+    assert {team.get(board, member)["status"] for member in members} == {200}
+    assert {team.get("/2024/day/1/input", member)["status"] for member in members} == {
+        200
+    }
+    for _ in range(ratelimit.BUCKETS["submit"][0] + 1):
+        assert (
+            team.post("/2024/day/1/answer", members.pop(), b"", None)["status"] == 200
+        )
+
+    # a spent budget serves a stale copy rather than waiting
+    monkeypatch.setattr(proxy, "_ttl", lambda path: 0)
+    fetches = len(UpstreamHandler.requests)
+    assert (
+        team.get(board, "0")["body"]
+        == team.entries[(board, team._scope(board, "0"))]["body"]
+    )
+    assert len(UpstreamHandler.requests) == fetches
+    # or, with nothing cached, a 429, which clients take as being rate limited
+    team.get(board, "c")
+    team.entries.clear()
+    assert team.get(board, "c")["status"] == 429
+    with pytest.raises(api.RateLimitedError):
+        api._request("GET", board, auth=True)
+    server.shutdown()
+    upstream.shutdown()
+
+
+def test_proxy_lru():
+    p = proxy.Proxy("http://127.0.0.1:1", max_bytes=10)
+    for path in ["/1", "/2", "/3"]:
+        p._remember((path, None), {"body": b"abcd"})
+    assert list(p.entries) == [("/2", None), ("/3", None)]
+    assert p.size == 8
+    p._forget(("/2", None))
+    assert p.size == 4
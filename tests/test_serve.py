@@ -0,0 +1,62 @@
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import aocstat.api as api
+import aocstat.serve as serve
+
+LB = {
+    "event": "2024",
+    "members": {
+        "1": {
+            "id": 1,
+            "name": "someone",
+            "local_score": 3,
+            "stars": 1,
+            "completion_day_level": {},
+        }
+    },
+}
+
+
+def test_serve(monkeypatch):
+    fetches = []
+
+    def get_priv_lb(id, yr):
+        fetches.append((id, yr))
+        threading.Event().wait(0.1)
+        return LB, False
+
+    monkeypatch.setattr(api, "get_priv_lb", get_priv_lb)
+    monkeypatch.setattr(api, "get_user_id", lambda: 1)
+    boards = {1: serve.Board(1, 2024)}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), serve._handler(boards))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path, headers={}):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        conn.request("GET", path, headers=headers)
+        res = conn.getresponse()
+        return res.status, res.getheader("ETag"), res.read()
+
+    try:
+        # however many clients there are, the board is fetched once
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            responses = list(pool.map(get, ["/1.txt"] * 20))
+        assert fetches == [(1, 2024)]
+        assert {status for status, _, _ in responses} == {200}
+        assert b"someone" in responses[0][2]
+
+        status, etag, body = get("/1.json")
+        assert json.loads(body) == LB
+        assert get("/1.json", {"If-None-Match": etag})[0] == 304
+        assert get("/")[2] == responses[0][2]
+        assert b"\x1b[" in get("/1.ansi")[2]
+        assert get("/2.txt")[0] == 404
+        assert get("/1.html")[0] == 404
+        assert len(fetches) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
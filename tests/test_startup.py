@@ -0,0 +1,77 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+import pytest
+
+import aocstat.api as api
+
+# slow to import, and only needed to fetch, authenticate, page or look up the
+# version, so a fully cached command shouldn't import any of them
+HEAVY_MODULES = [
+    "requests",
+    "bs4",
+    "selenium",
+    "concurrent.futures",
+    "pydoc",
+    "importlib.metadata",
+]
+
+SCRIPT = """
+import json, sys
+already = set(sys.modules)
+import aocstat.main
+aocstat.main.start(sys.argv[1:])
+print(json.dumps(sorted(set(sys.modules) - already)), file=sys.stderr)
+"""
+
+
+def _seed_cache(data_dir):
+    year = api.get_most_recent_year()
+    lb = {
+        "event": str(year),
+        "members": {
+            "1": {"name": "someone", "local_score": 1, "completion_day_level": {}}
+        },
+    }
+    entries = {
+        "cookie": "cookie",
+        "id": 1,
+        "prog": {"year": 2024, "day": 1, "part": 1},
+        "stars_2024": {"time": time.time(), "content": 0},
+        "in_2024_1": "input\n",
+        "lb_ids": {"time": time.time(), "content": [123]},
+        f"lb_{year}_123": {"time": time.time(), "content": json.dumps(lb).encode()},
+    }
+    os.makedirs(data_dir)
+    for key, value in entries.items():
+        with open(os.path.join(data_dir, key), "wb") as f:
+            pickle.dump(value, f)
+
+
+@pytest.mark.parametrize("args", [["pz", "input"], ["lb", "priv", "--no-pager"]])
+def test_cached_startup(tmp_path, args):
+    _seed_cache(tmp_path / "data" / "aocstat")
+    os.makedirs(tmp_path / "config" / "aocstat")
+    env = dict(
+        os.environ,
+        XDG_DATA_HOME=str(tmp_path / "data"),
+        XDG_CONFIG_HOME=str(tmp_path / "config"),
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", SCRIPT, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = json.loads(res.stderr.strip().split("\n")[-1])
+    assert not [
+        name
+        for name in imported
+        for heavy in HEAVY_MODULES
+        if name == heavy or name.startswith(f"{heavy}.")
+    ]
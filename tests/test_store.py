@@ -0,0 +1,51 @@
+import pickle
+import sqlite3
+
+import pytest
+
+import aocstat.store as store
+
+
+@pytest.mark.parametrize("backend", store.BACKENDS)
+def test_read_write(tmp_path, backend):
+    cache = store.BACKENDS[backend](str(tmp_path))
+    record = {"time": 1.0, "content": b"{}", "etag": '"abc"', "hash": "0"}
+    assert cache.read("lb_2024_1") is None
+    assert cache.written("lb_2024_1") is None
+
+    cache.write("lb_2024_1", record)
+    cache.write("pz_2024_1_2", {"title": "Title", "text": []})
+    cache.write("cookie", "cookie")
+    assert cache.read("lb_2024_1") == record
+    assert cache.read("cookie") == "cookie"
+    assert cache.written("lb_2024_1") is not None
+    assert sorted(cache.keys()) == ["cookie", "lb_2024_1", "pz_2024_1_2"]
+
+    cache.delete("cookie")
+    assert cache.read("cookie") is None
+    cache.purge()
+    assert cache.keys() == []
+
+
+def test_sqlite_migration(tmp_path):
+    record = {"time": 1.0, "content": b"{}", "etag": '"abc"'}
+    for key, value in {"lb_2024_123": record, "id": 1, "in_2024_1": "input\n"}.items():
+        with open(tmp_path / key, "wb") as f:
+            pickle.dump(value, f)
+    (tmp_path / "lb_2024_123.lock").touch()
+    (tmp_path / "notes.txt").write_text("not a pickle")
+
+    cache = store.open_store("sqlite", str(tmp_path))
+    assert cache.read("lb_2024_123") == record
+    assert cache.read("in_2024_1") == "input\n"
+    # files that aren't entries are left alone
+    assert sorted(p.name for p in tmp_path.iterdir() if store._is_entry(p.name)) == [
+        "notes.txt"
+    ]
+
+    # validators are stored alongside the value, so the cache can be queried
+    conn = sqlite3.connect(tmp_path / store.DB_NAME)
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert conn.execute(
+        "SELECT year, id, fetched, etag FROM leaderboards"
+    ).fetchall() == [(2024, 123, 1.0, '"abc"')]